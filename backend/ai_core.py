@@ -1,61 +1,98 @@
-from openai import OpenAI
-from personality import PERSONALITIES, current_persona
+import asyncio
+from openai import (
+    AsyncOpenAI, APIConnectionError, APITimeoutError, DefaultAsyncHttpxClient,
+    InternalServerError, RateLimitError, Timeout
+)
 import random
+from async_runner import async_runner
 from config import Config
 from logger import setup_logger
-from typing import AsyncGenerator, List, Dict
+from prompt_builder import build_messages
+from typing import AsyncGenerator, Awaitable, Callable, Iterator, List, Dict, Optional, TypeVar
+
+try:
+    import httpx2 as httpx  # the HTTP client newer openai releases are built on
+except ImportError:
+    import httpx
 
 logger = setup_logger("ai_core")
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
-def generate_response(
-    user_text: str, 
-    emotion: str, 
-    sentiment: str, 
+FALLBACK_RESPONSE = "I'm having trouble thinking right now. Can you try again?"
+
+# Worth another attempt: network trouble, timeouts, rate limits and 5xx responses
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+T = TypeVar("T")
+
+_client: Optional[AsyncOpenAI] = None
+_request_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_client() -> AsyncOpenAI:
+    """
+    Shared async client; its connection pool is sized to the concurrency limit.
+    Created on first use, on the loop every request runs on (async_runner's).
+    """
+    global _client, _request_slots
+    if _client is None:
+        limits = httpx.Limits(
+            max_connections=Config.MAX_CONCURRENT_REQUESTS,
+            max_keepalive_connections=Config.MAX_CONCURRENT_REQUESTS
+        )
+        _client = AsyncOpenAI(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_BASE_URL,
+            timeout=Timeout(Config.REQUEST_TIMEOUT, connect=10.0),
+            max_retries=0,  # retried below, with jitter and under the semaphore
+            http_client=DefaultAsyncHttpxClient(limits=limits)
+        )
+        _request_slots = asyncio.Semaphore(Config.MAX_CONCURRENT_REQUESTS)
+    return _client
+
+
+async def _with_retries(call: Callable[[], Awaitable[T]]) -> T:
+    """Await call(), retrying transient failures with full-jitter exponential backoff"""
+    for attempt in range(Config.AI_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == Config.AI_MAX_RETRIES:
+                raise
+            delay = random.uniform(0, min(Config.AI_RETRY_MAX_DELAY, Config.AI_RETRY_BASE_DELAY * 2 ** attempt))
+            logger.warning(f"AI request failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+def build_chat_history(
+    user_text: str,
+    emotion: str,
+    sentiment: str,
     history: List[Dict] = None,
     personality: str = None
-) -> str:
-    """Generate AI response (non-streaming version for compatibility)"""
-    if history is None:
-        history = []
-    
-    if personality is None:
-        personality = current_persona
-        
-    persona = PERSONALITIES.get(personality, PERSONALITIES["neutral"])
-    
-    prompt = f"""
-    You are ROOMii, an emotionally intelligent AI roommate and friend.
-    Your personality: {personality} — {persona['style']}.
-    Speaking style: {persona['prompt_tone']}
-    
-    The user's detected emotion is {emotion}, and their voice sentiment is {sentiment}.
-    Your goal: respond in a friendly, natural, and emotionally aware way.
-    Keep your tone conversational, not robotic.
-    Never repeat exact phrasing — sound like a genuine friend who listens and cares.
-    Keep responses concise (2-3 sentences max) unless the user asks for more detail.
-    """
+) -> List[Dict]:
+    """Build the message list sent to the chat completions API, within the prompt token budget"""
+    return build_messages(user_text, emotion, sentiment, history, personality)
 
-    # Build chat history
-    chat_history = [{"role": "system", "content": prompt}]
-    
-    # Add conversation context
-    for msg in history[-Config.CONVERSATION_CONTEXT_LENGTH:]:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        if content:
-            chat_history.append({"role": role, "content": content})
-    
-    # Add current message
-    chat_history.append({"role": "user", "content": user_text})
+
+async def agenerate_response(
+    user_text: str,
+    emotion: str,
+    sentiment: str,
+    history: List[Dict] = None,
+    personality: str = None
+) -> str:
+    """Generate AI response without streaming"""
+    chat_history = build_chat_history(user_text, emotion, sentiment, history, personality)
+    client = _get_client()
 
     try:
-        response = client.chat.completions.create(
-            model=Config.AI_MODEL,
-            messages=chat_history,
-            temperature=Config.AI_TEMPERATURE,
-            max_tokens=Config.AI_MAX_TOKENS
-        )
+        async with _request_slots:
+            response = await _with_retries(lambda: client.chat.completions.create(
+                model=Config.AI_MODEL,
+                messages=chat_history,
+                temperature=Config.AI_TEMPERATURE,
+                max_tokens=Config.AI_MAX_TOKENS
+            ))
         
         reply = response.choices[0].message.content.strip()
         logger.info(f"AI response generated: {reply[:50]}...")
@@ -63,7 +100,18 @@ def generate_response(
         
     except Exception as e:
         logger.error(f"AI generation error: {e}")
-        return "I'm having trouble thinking right now. Can you try again?"
+        return FALLBACK_RESPONSE
+
+
+def generate_response(
+    user_text: str, 
+    emotion: str, 
+    sentiment: str, 
+    history: List[Dict] = None,
+    personality: str = None
+) -> str:
+    """Generate AI response (blocking version for handler threads)"""
+    return async_runner.run(agenerate_response(user_text, emotion, sentiment, history, personality))
 
 
 async def generate_response_stream(
@@ -73,56 +121,65 @@ async def generate_response_stream(
     history: List[Dict] = None,
     personality: str = None
 ) -> AsyncGenerator[str, None]:
-    """Generate AI response with streaming"""
-    if history is None:
-        history = []
-    
-    if personality is None:
-        personality = current_persona
-        
-    persona = PERSONALITIES.get(personality, PERSONALITIES["neutral"])
-    
-    prompt = f"""
-    You are ROOMii, an emotionally intelligent AI roommate and friend.
-    Your personality: {personality} — {persona['style']}.
-    Speaking style: {persona['prompt_tone']}
-    
-    The user's detected emotion is {emotion}, and their voice sentiment is {sentiment}.
-    Your goal: respond in a friendly, natural, and emotionally aware way.
-    Keep your tone conversational, not robotic.
-    Never repeat exact phrasing — sound like a genuine friend who listens and cares.
-    Keep responses concise (2-3 sentences max) unless the user asks for more detail.
     """
+    Generate AI response with streaming.
+    Holds a request slot until the stream ends or the generator is closed.
+    """
+    chat_history = build_chat_history(user_text, emotion, sentiment, history, personality)
+    client = _get_client()
 
-    # Build chat history
-    chat_history = [{"role": "system", "content": prompt}]
-    
-    # Add conversation context
-    for msg in history[-Config.CONVERSATION_CONTEXT_LENGTH:]:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        if content:
-            chat_history.append({"role": role, "content": content})
-    
-    # Add current message
-    chat_history.append({"role": "user", "content": user_text})
+    async with _request_slots:
+        try:
+            # Only opening the stream is retried; tokens already sent can't be taken back
+            stream = await _with_retries(lambda: client.chat.completions.create(
+                model=Config.AI_MODEL,
+                messages=chat_history,
+                temperature=Config.AI_TEMPERATURE,
+                max_tokens=Config.AI_MAX_TOKENS,
+                stream=True
+            ))
+        except Exception as e:
+            logger.error(f"AI streaming error: {e}")
+            yield FALLBACK_RESPONSE
+            return
 
-    try:
-        stream = client.chat.completions.create(
-            model=Config.AI_MODEL,
-            messages=chat_history,
-            temperature=Config.AI_TEMPERATURE,
-            max_tokens=Config.AI_MAX_TOKENS,
-            stream=True
-        )
-        
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
-                
-    except Exception as e:
-        logger.error(f"AI streaming error: {e}")
-        yield "I'm having trouble thinking right now. Can you try again?"
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"AI streaming error: {e}")
+            yield FALLBACK_RESPONSE
+        finally:
+            await stream.close()
 
 
+async def _next_token(tokens: AsyncGenerator[str, None]):
+    """(True, token), or (False, None) once the stream is done"""
+    try:
+        return True, await tokens.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
 
+def generate_response_chunks(
+    user_text: str,
+    emotion: str,
+    sentiment: str,
+    history: List[Dict] = None,
+    personality: str = None
+) -> Iterator[str]:
+    """
+    Generate AI response as a blocking token iterator for handler threads.
+    Tokens come from the async stream on the shared event loop; closing the
+    generator early closes the underlying HTTP stream and frees its slot.
+    """
+    tokens = generate_response_stream(user_text, emotion, sentiment, history, personality)
+    try:
+        while True:
+            more, token = async_runner.run(_next_token(tokens))
+            if not more:
+                return
+            yield token
+    finally:
+        async_runner.run(tokens.aclose())
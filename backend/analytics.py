@@ -3,240 +3,354 @@ Analytics Engine for ROOMie
 Generates insights and statistics from emotion/conversation data
 """
 import asyncio
-from datetime import datetime, timedelta
-from typing import List, Dict
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Dict, Optional, Tuple
+import numpy as np
 from conversation_memory import memory
+from config import Config
 from logger import setup_logger
-import json
 
 logger = setup_logger("analytics")
 
+HOUR = 3600
+DAY = 86400
+CALENDAR_DAYS = 30
+INSIGHT_DAYS = 7
+
+POSITIVE_EMOTIONS = ['happy', 'surprise', 'calm']
+NEGATIVE_EMOTIONS = ['sad', 'angry', 'fear']
+# Hourly trend scores have always used a narrower split
+TREND_POSITIVE = ['happy', 'surprise']
+TREND_NEGATIVE = ['sad', 'angry']
+
+
+class EmotionFrame:
+    """Hourly or daily emotion rollups for one user as parallel NumPy arrays"""
+
+    def __init__(self, rollups: List[Dict]):
+        emotions = [row['emotion'] for row in rollups]
+        # labels are sorted; codes index into them
+        self.labels, codes = np.unique(np.array(emotions, dtype=object), return_inverse=True)
+        self.labels = [str(label) for label in self.labels]
+        self.codes = codes.astype(np.int64)
+        self.buckets = np.fromiter((row['bucket'] for row in rollups), dtype=np.int64, count=len(rollups))
+        self.counts = np.fromiter((row['count'] for row in rollups), dtype=np.int64, count=len(rollups))
+        self.confidence = np.fromiter(
+            (row['confidence_sum'] for row in rollups), dtype=np.float64, count=len(rollups)
+        )
+
+    def since(self, cutoff: int) -> np.ndarray:
+        """Mask of rows whose hour bucket is at or after the hour containing cutoff"""
+        return self.buckets >= cutoff - cutoff % HOUR
+
+    def grouped_counts(self, mask: np.ndarray, bucket_seconds: int):
+        """Counts per (time bucket, emotion) in one bincount: (bucket starts, counts matrix)"""
+        keys = self.buckets[mask] - self.buckets[mask] % bucket_seconds
+        starts, rows = np.unique(keys, return_inverse=True)
+        n_labels = len(self.labels)
+        matrix = np.bincount(
+            rows * n_labels + self.codes[mask],
+            weights=self.counts[mask],
+            minlength=len(starts) * n_labels
+        ).reshape(len(starts), n_labels).astype(np.int64)
+        return starts, matrix
+
+    def distribution(self, counts: np.ndarray) -> Dict[str, int]:
+        """Map a per-label counts vector to {emotion: count}, skipping zeros"""
+        return {self.labels[i]: int(c) for i, c in enumerate(counts) if c}
+
+    def label_indexes(self, emotions: List[str]) -> List[int]:
+        return [self.labels.index(e) for e in emotions if e in self.labels]
+
+
+class AnalyticsCache:
+    """
+    Computed dashboards per (user, days) with a TTL.
+    Entries for a user are dropped as soon as their history changes.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, Dict]]" = OrderedDict()
+        # Bumped on invalidation so a computation that raced a write isn't stored
+        self._generations: Dict[int, int] = {}
+        self._global_generation = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        """Token to pass to put() for a computation that started now"""
+        with self._lock:
+            return self._global_generation, self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, days: int) -> Optional[Dict]:
+        key = (user_id, days)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: int, days: int, value: Dict, generation: Tuple[int, int]):
+        with self._lock:
+            if generation != (self._global_generation, self._generations.get(user_id, 0)):
+                return
+            self._entries[(user_id, days)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((user_id, days))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop a user's entries, or every entry when user_id is None"""
+        with self._lock:
+            self.invalidations += 1
+            if user_id is None:
+                self._global_generation += 1
+                self._entries.clear()
+                return
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl
+            }
+
+
 class AnalyticsEngine:
     """Generate analytics and insights from user data"""
-    
+
+    def __init__(self, cache_ttl: float = Config.ANALYTICS_CACHE_TTL):
+        self.cache = AnalyticsCache(cache_ttl)
+        # New emotion records and conversations make cached dashboards stale
+        memory.add_write_listener(self.cache.invalidate)
+
+    async def _load_frame(self, user_id: int, days: int, granularity: str = "hour") -> EmotionFrame:
+        """Fetch rollups covering the last N days, from the start of the first day"""
+        since = int(time.time()) - days * DAY
+        rollups = await memory.get_emotion_rollups(user_id, since - since % DAY, granularity=granularity)
+        return EmotionFrame(rollups)
+
+    async def get_dashboard(self, user_id: int, days: int = 7) -> Dict:
+        """
+        Compute summary, insights and trends from one fetch of hourly rollups
+        and the calendar from daily ones, in vectorized passes over each.
+        The three reads run concurrently: trends need hourly buckets, the
+        calendar's 30 days come from the daily table at 1/24 of the rows, and
+        the conversation count is an index-only COUNT.
+        Results are cached per (user, days); treat the returned dict as read-only.
+        """
+        cached = self.cache.get(user_id, days)
+        if cached is not None:
+            return cached
+
+        generation = self.cache.generation(user_id)
+        try:
+            frame, daily, conversation_count = await asyncio.gather(
+                self._load_frame(user_id, max(days, INSIGHT_DAYS)),
+                self._load_frame(user_id, CALENDAR_DAYS, granularity="day"),
+                memory.count_recent_conversations(user_id, limit=50)
+            )
+            now = int(time.time())
+            summary = self._summary_view(frame, now, days)
+            weekly = summary if days == INSIGHT_DAYS else self._summary_view(frame, now, INSIGHT_DAYS)
+            dashboard = {
+                'summary': summary,
+                'calendar': self._calendar_view(daily, now, CALENDAR_DAYS),
+                'insights': self._insights_view(weekly, conversation_count),
+                'trends': self._trends_view(frame, now, days)
+            }
+        except Exception as e:
+            logger.error(f"Error generating dashboard: {e}")
+            return {'summary': {}, 'calendar': [], 'insights': [], 'trends': []}
+
+        self.cache.put(user_id, days, dashboard, generation)
+        return dashboard
+
     async def get_emotion_summary(self, user_id: int, days: int = 7) -> Dict:
         """Get emotion summary for the last N days"""
         try:
-            # Get emotion history for specific user
-            emotions = await memory.get_emotion_history(user_id, hours=days * 24)
-            
-            if not emotions:
-                return {
-                    "total_records": 0,
-                    "dominant_emotion": "neutral",
-                    "emotion_distribution": {},
-                    "average_confidence": 0.0,
-                    "mood_score": 50
-                }
-            
-            # Calculate distribution
-            emotion_counts = {}
-            total_confidence = 0
-            
-            for record in emotions:
-                emotion = record['emotion']
-                confidence = record.get('confidence', 0)
-                
-                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-                total_confidence += confidence
-            
-            # Find dominant emotion
-            dominant = max(emotion_counts.items(), key=lambda x: x[1])[0]
-            
-            # Calculate mood score (0-100)
-            positive_emotions = ['happy', 'surprise', 'calm']
-            negative_emotions = ['sad', 'angry', 'fear']
-            
-            positive_count = sum(emotion_counts.get(e, 0) for e in positive_emotions)
-            negative_count = sum(emotion_counts.get(e, 0) for e in negative_emotions)
-            total = len(emotions)
-            
-            mood_score = int(((positive_count - negative_count) / total + 1) * 50)
-            mood_score = max(0, min(100, mood_score))  # Clamp to 0-100
-            
-            return {
-                "total_records": len(emotions),
-                "dominant_emotion": dominant,
-                "emotion_distribution": emotion_counts,
-                "average_confidence": total_confidence / len(emotions) if emotions else 0,
-                "mood_score": mood_score,
-                "period_days": days
-            }
-        
+            frame = await self._load_frame(user_id, days)
+            return self._summary_view(frame, int(time.time()), days)
         except Exception as e:
             logger.error(f"Error generating emotion summary: {e}")
             return {}
-    
+
     async def get_mood_calendar(self, user_id: int, days: int = 30) -> List[Dict]:
         """Get daily mood data for calendar heatmap"""
         try:
-            emotions = await memory.get_emotion_history(user_id, hours=days * 24)
-            
-            # Group by date
-            daily_moods = {}
-            
-            for record in emotions:
-                timestamp = record.get('timestamp', '')
-                if not timestamp:
-                    continue
-                
-                date = timestamp.split('T')[0]  # Get date part
-                emotion = record['emotion']
-                
-                if date not in daily_moods:
-                    daily_moods[date] = {
-                        'date': date,
-                        'emotions': {},
-                        'count': 0
-                    }
-                
-                daily_moods[date]['emotions'][emotion] = \
-                    daily_moods[date]['emotions'].get(emotion, 0) + 1
-                daily_moods[date]['count'] += 1
-            
-            # Calculate dominant emotion and intensity for each day
-            calendar_data = []
-            for date, data in sorted(daily_moods.items()):
-                dominant = max(data['emotions'].items(), key=lambda x: x[1])[0]
-                intensity = data['count'] / 10  # Normalize intensity
-                intensity = min(1.0, intensity)  # Cap at 1.0
-                
-                calendar_data.append({
-                    'date': date,
-                    'dominant_emotion': dominant,
-                    'intensity': intensity,
-                    'count': data['count'],
-                    'emotions': data['emotions']
-                })
-            
-            return calendar_data
-        
+            frame = await self._load_frame(user_id, days, granularity="day")
+            return self._calendar_view(frame, int(time.time()), days)
         except Exception as e:
             logger.error(f"Error generating mood calendar: {e}")
             return []
-    
+
     async def generate_insights(self, user_id: int) -> List[Dict]:
         """Generate AI-powered insights from user data"""
         try:
-            # Get data for specific user
-            summary = await self.get_emotion_summary(user_id, days=7)
-            conversations = await memory.get_recent_conversations(user_id, limit=50)
-            
-            insights = []
-            
-            # Insight 1: Dominant emotion
-            if summary.get('dominant_emotion'):
-                dominant = summary['dominant_emotion']
-                count = summary['emotion_distribution'].get(dominant, 0)
-                total = summary['total_records']
-                percentage = int((count / total) * 100) if total > 0 else 0
-                
-                insights.append({
-                    'type': 'dominant_emotion',
-                    'title': f'You\'re mostly {dominant} this week',
-                    'description': f'{percentage}% of your emotions were {dominant}',
-                    'icon': self._get_emotion_emoji(dominant),
-                    'severity': 'info'
-                })
-            
-            # Insight 2: Mood score
-            mood_score = summary.get('mood_score', 50)
-            if mood_score >= 70:
-                insights.append({
-                    'type': 'positive_trend',
-                    'title': 'Great mood this week! 🎉',
-                    'description': f'Your mood score is {mood_score}/100. Keep it up!',
-                    'icon': '😊',
-                    'severity': 'success'
-                })
-            elif mood_score <= 30:
-                insights.append({
-                    'type': 'low_mood',
-                    'title': 'Tough week detected',
-                    'description': f'Your mood score is {mood_score}/100. Want to talk about it?',
-                    'icon': '💙',
-                    'severity': 'warning'
-                })
-            
-            # Insight 3: Conversation count
-            if len(conversations) > 20:
-                insights.append({
-                    'type': 'engagement',
-                    'title': 'You\'re very engaged!',
-                    'description': f'{len(conversations)} conversations this week. ROOMie loves chatting with you!',
-                    'icon': '💬',
-                    'severity': 'info'
-                })
-            
-            # Insight 4: Emotion variety
-            variety = len(summary.get('emotion_distribution', {}))
-            if variety >= 5:
-                insights.append({
-                    'type': 'emotional_range',
-                    'title': 'Wide emotional range',
-                    'description': f'You\'ve experienced {variety} different emotions. That\'s healthy!',
-                    'icon': '🌈',
-                    'severity': 'info'
-                })
-            
-            return insights
-        
+            frame, conversation_count = await asyncio.gather(
+                self._load_frame(user_id, INSIGHT_DAYS),
+                memory.count_recent_conversations(user_id, limit=50)
+            )
+            summary = self._summary_view(frame, int(time.time()), INSIGHT_DAYS)
+            return self._insights_view(summary, conversation_count)
         except Exception as e:
             logger.error(f"Error generating insights: {e}")
             return []
-    
+
     async def get_emotion_trends(self, user_id: int, days: int = 7) -> List[Dict]:
         """Get emotion trends over time"""
         try:
-            emotions = await memory.get_emotion_history(user_id, hours=days * 24)
-            
-            # Group by hour
-            hourly_data = {}
-            
-            for record in emotions:
-                timestamp = record.get('timestamp', '')
-                if not timestamp:
-                    continue
-                
-                # Parse timestamp and get hour
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                hour_key = dt.strftime('%Y-%m-%d %H:00')
-                
-                if hour_key not in hourly_data:
-                    hourly_data[hour_key] = {
-                        'timestamp': hour_key,
-                        'emotions': {},
-                        'count': 0
-                    }
-                
-                emotion = record['emotion']
-                hourly_data[hour_key]['emotions'][emotion] = \
-                    hourly_data[hour_key]['emotions'].get(emotion, 0) + 1
-                hourly_data[hour_key]['count'] += 1
-            
-            # Convert to list and calculate scores
-            trends = []
-            for hour, data in sorted(hourly_data.items()):
-                # Calculate positivity score
-                positive = data['emotions'].get('happy', 0) + data['emotions'].get('surprise', 0)
-                negative = data['emotions'].get('sad', 0) + data['emotions'].get('angry', 0)
-                total = data['count']
-                
-                score = int(((positive - negative) / total + 1) * 50) if total > 0 else 50
-                
-                trends.append({
-                    'timestamp': hour,
-                    'mood_score': score,
-                    'count': total,
-                    'emotions': data['emotions']
-                })
-            
-            return trends
-        
+            frame = await self._load_frame(user_id, days)
+            return self._trends_view(frame, int(time.time()), days)
         except Exception as e:
             logger.error(f"Error generating trends: {e}")
             return []
-    
+
+    def _summary_view(self, frame: EmotionFrame, now: int, days: int) -> Dict:
+        mask = frame.since(now - days * DAY)
+        counts = np.bincount(frame.codes[mask], weights=frame.counts[mask], minlength=len(frame.labels))
+        total = int(counts.sum())
+
+        if not total:
+            return {
+                "total_records": 0,
+                "dominant_emotion": "neutral",
+                "emotion_distribution": {},
+                "average_confidence": 0.0,
+                "mood_score": 50
+            }
+
+        # Calculate mood score (0-100)
+        positive_count = counts[frame.label_indexes(POSITIVE_EMOTIONS)].sum()
+        negative_count = counts[frame.label_indexes(NEGATIVE_EMOTIONS)].sum()
+        mood_score = int(((positive_count - negative_count) / total + 1) * 50)
+        mood_score = max(0, min(100, mood_score))  # Clamp to 0-100
+
+        return {
+            "total_records": total,
+            "dominant_emotion": frame.labels[int(np.argmax(counts))],
+            "emotion_distribution": frame.distribution(counts),
+            "average_confidence": float(frame.confidence[mask].sum()) / total,
+            "mood_score": mood_score,
+            "period_days": days
+        }
+
+    def _calendar_view(self, frame: EmotionFrame, now: int, days: int) -> List[Dict]:
+        since = now - days * DAY
+        starts, matrix = frame.grouped_counts(frame.buckets >= since - since % DAY, DAY)
+        if not len(starts):
+            return []
+        totals = matrix.sum(axis=1)
+        dominant = matrix.argmax(axis=1)
+
+        calendar_data = []
+        for day_start, row, total, top in zip(starts, matrix, totals, dominant):
+            calendar_data.append({
+                'date': time.strftime('%Y-%m-%d', time.gmtime(int(day_start))),
+                'dominant_emotion': frame.labels[int(top)],
+                'intensity': min(1.0, int(total) / 10),  # Normalize intensity, cap at 1.0
+                'count': int(total),
+                'emotions': frame.distribution(row)
+            })
+        return calendar_data
+
+    def _trends_view(self, frame: EmotionFrame, now: int, days: int) -> List[Dict]:
+        starts, matrix = frame.grouped_counts(frame.since(now - days * DAY), HOUR)
+        if not len(starts):
+            return []
+        totals = matrix.sum(axis=1)
+        positive = matrix[:, frame.label_indexes(TREND_POSITIVE)].sum(axis=1)
+        negative = matrix[:, frame.label_indexes(TREND_NEGATIVE)].sum(axis=1)
+
+        trends = []
+        for hour_start, row, total, pos, neg in zip(starts, matrix, totals, positive, negative):
+            trends.append({
+                'timestamp': time.strftime('%Y-%m-%d %H:00', time.gmtime(int(hour_start))),
+                'mood_score': int(((pos - neg) / total + 1) * 50) if total > 0 else 50,
+                'count': int(total),
+                'emotions': frame.distribution(row)
+            })
+        return trends
+
+    def _insights_view(self, summary: Dict, conversation_count: int) -> List[Dict]:
+        insights = []
+
+        # Insight 1: Dominant emotion
+        if summary.get('dominant_emotion'):
+            dominant = summary['dominant_emotion']
+            count = summary['emotion_distribution'].get(dominant, 0)
+            total = summary['total_records']
+            percentage = int((count / total) * 100) if total > 0 else 0
+
+            insights.append({
+                'type': 'dominant_emotion',
+                'title': f'You\'re mostly {dominant} this week',
+                'description': f'{percentage}% of your emotions were {dominant}',
+                'icon': self._get_emotion_emoji(dominant),
+                'severity': 'info'
+            })
+
+        # Insight 2: Mood score
+        mood_score = summary.get('mood_score', 50)
+        if mood_score >= 70:
+            insights.append({
+                'type': 'positive_trend',
+                'title': 'Great mood this week! 🎉',
+                'description': f'Your mood score is {mood_score}/100. Keep it up!',
+                'icon': '😊',
+                'severity': 'success'
+            })
+        elif mood_score <= 30:
+            insights.append({
+                'type': 'low_mood',
+                'title': 'Tough week detected',
+                'description': f'Your mood score is {mood_score}/100. Want to talk about it?',
+                'icon': '💙',
+                'severity': 'warning'
+            })
+
+        # Insight 3: Conversation count
+        if conversation_count > 20:
+            insights.append({
+                'type': 'engagement',
+                'title': 'You\'re very engaged!',
+                'description': f'{conversation_count} conversations this week. ROOMie loves chatting with you!',
+                'icon': '💬',
+                'severity': 'info'
+            })
+
+        # Insight 4: Emotion variety
+        variety = len(summary.get('emotion_distribution', {}))
+        if variety >= 5:
+            insights.append({
+                'type': 'emotional_range',
+                'title': 'Wide emotional range',
+                'description': f'You\'ve experienced {variety} different emotions. That\'s healthy!',
+                'icon': '🌈',
+                'severity': 'info'
+            })
+
+        return insights
+
     def _get_emotion_emoji(self, emotion: str) -> str:
         """Get emoji for emotion"""
         emoji_map = {
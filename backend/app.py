@@ -1,13 +1,20 @@
 from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
-from emotion_detector import get_cached_emotion, BackgroundEmotionMonitor
+from emotion_detector import get_cached_emotion, emotion_monitor, session_stats
+from emotion_events import emotion_events
 from main import get_roomie_response
 from websocket_handler import init_socketio
 from conversation_memory import memory
+from async_runner import async_runner
+from tts_cache import tts_cache
+from analytics import analytics_engine
+from frame_source import frame_source
+from inference_worker import inference_worker
+from model_registry import model_registry
 from config import Config
 from logger import setup_logger
 import os
-import asyncio
+import atexit
 import time
 from pathlib import Path
 
@@ -20,19 +27,34 @@ CORS(app)
 # Initialize SocketIO
 socketio = init_socketio(app)
 
-# Initialize and start background emotion monitor immediately
-emotion_monitor = BackgroundEmotionMonitor(interval=3.0)  # Check every 3 seconds
+# Start the shared emotion monitor; it stays paused until a client connects
 emotion_monitor.start()
-logger.info("Background emotion monitor started")
+
+# Load the face models in the background; /health reports when they are ready
+if Config.MODEL_WARMUP:
+    model_registry.warm_up()
 
 # Initialize database and audio directory on startup
 try:
-    asyncio.run(memory.initialize())
+    async_runner.start()
+    async_runner.run(memory.initialize())
     Path(Config.AUDIO_DIR).mkdir(exist_ok=True)
     logger.info("Database and audio directory initialized")
 except Exception as e:
     logger.error(f"Initialization error: {e}")
 
+@atexit.register
+def shutdown():
+    """Stop background capture and detection, close pooled database connections and the event loop on exit"""
+    emotion_monitor.stop()
+    frame_source.stop()
+    inference_worker.stop()
+    try:
+        async_runner.run(memory.close(), timeout=5)
+    except Exception as e:
+        logger.error(f"Shutdown error: {e}")
+    async_runner.stop()
+
 @app.before_request
 def before_first_request():
     """Mark app as initialized"""
@@ -107,7 +129,15 @@ def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'emotion_monitor': emotion_monitor.is_alive() if emotion_monitor else False,
+        'ready': model_registry.ready(),
+        'models': model_registry.status(),
+        'emotion_monitor': emotion_monitor.health(),
+        'client_streams': session_stats(),
+        'emotion_events': emotion_events.stats(),
+        'tts_cache': tts_cache.stats(),
+        'analytics_cache': analytics_engine.cache.stats(),
+        'camera': frame_source.stats(),
+        'inference': inference_worker.stats(),
         'timestamp': time.time()
     })
 
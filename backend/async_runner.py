@@ -0,0 +1,79 @@
+"""
+Persistent background event loop for ROOMie
+Lets the threading-mode Socket.IO handlers run coroutines without
+creating and tearing down an event loop per call
+"""
+import asyncio
+import concurrent.futures
+from threading import Thread, Lock
+from typing import Any, Awaitable, Optional
+from logger import setup_logger
+
+logger = setup_logger("async_runner")
+
+
+class AsyncRunner:
+    """Runs one asyncio event loop in a daemon thread"""
+
+    def __init__(self, name: str = "roomie-async"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def start(self):
+        """Start the background loop if it isn't running yet"""
+        with self._lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = Thread(target=self._run_loop, name=self.name, daemon=True)
+            self.thread.start()
+            logger.info("Background event loop started")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def is_running(self) -> bool:
+        return bool(self.thread and self.thread.is_alive())
+
+    def submit(self, coro: Awaitable) -> concurrent.futures.Future:
+        """Schedule a coroutine from any thread and return a future for its result"""
+        if not self.is_running():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the background loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def spawn(self, coro: Awaitable, description: str = "background task") -> concurrent.futures.Future:
+        """Schedule a coroutine without waiting for it; failures are logged"""
+        def _log_failure(future: concurrent.futures.Future):
+            if not future.cancelled() and future.exception():
+                logger.error(f"{description} failed: {future.exception()}")
+
+        future = self.submit(coro)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def stop(self, timeout: float = 2.0):
+        """Stop the background loop; call again if a slow callback kept it running"""
+        with self._lock:
+            if self.thread is None:
+                return
+            if self.thread.is_alive():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=timeout)
+                if self.thread.is_alive():
+                    # A callback is still running; closing the loop under it would raise
+                    logger.warning(f"Background event loop did not stop within {timeout} s")
+                    return
+            self.loop.close()
+            self.thread = None
+            logger.info("Background event loop stopped")
+
+
+# Global instance
+async_runner = AsyncRunner()
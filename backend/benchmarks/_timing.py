@@ -0,0 +1,23 @@
+"""
+Shared timing helpers for the benchmark scripts
+"""
+import statistics
+import time
+
+
+def time_calls(fn, iterations: int) -> dict:
+    """Call fn repeatedly; p50 and p95 latency in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def report(label: str, result: dict, precision: int = 2):
+    print(f"  {label:<34} p50 {result['p50_ms']:8.{precision}f} ms   p95 {result['p95_ms']:8.{precision}f} ms")
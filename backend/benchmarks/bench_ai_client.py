@@ -0,0 +1,181 @@
+"""
+Benchmark: AI client, blocking per-thread calls vs the shared async client
+
+Starts a local mock OpenAI-compatible server (chat completions, streamed or
+not, with fixed latency and an optional share of 503 errors), then sends the
+same requests from a pool of handler threads through:
+  sync   - a synchronous OpenAI client, as ai_core used to build
+  async  - ai_core's shared AsyncOpenAI client, semaphore and retries
+Reports throughput, latency percentiles, failures and the peak number of
+requests the server saw at once (bounded by MAX_CONCURRENT_REQUESTS for async).
+
+Usage (from backend/):
+    python benchmarks/bench_ai_client.py --requests 100 --threads 20 --latency 0.2 --fail-rate 0.1
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+
+class MockState:
+    def __init__(self, latency: float, fail_rate: float, tokens: int):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.tokens = tokens
+        self.lock = Lock()
+        self.active = 0
+        self.peak = 0
+        self.served = 0
+        self.failed = 0
+
+    def reset(self):
+        with self.lock:
+            self.active = self.peak = self.served = self.failed = 0
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows up
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with state.lock:
+                state.active += 1
+                state.peak = max(state.peak, state.active)
+            try:
+                time.sleep(state.latency)
+                if random.random() < state.fail_rate:
+                    with state.lock:
+                        state.failed += 1
+                    self._send(503, "application/json", json.dumps({"error": {"message": "overloaded"}}).encode())
+                    return
+                words = [f"word{i} " for i in range(state.tokens)]
+                if body.get("stream"):
+                    self._stream(words)
+                else:
+                    self._send(200, "application/json", json.dumps({
+                        "id": "mock", "object": "chat.completion", "created": 0, "model": "mock",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(words)}}],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": len(words), "total_tokens": len(words) + 1}
+                    }).encode())
+                with state.lock:
+                    state.served += 1
+            finally:
+                with state.lock:
+                    state.active -= 1
+
+        def _send(self, status: int, content_type: str, payload: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, words):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in words:
+                chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                         "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    return Handler
+
+
+def run(call, requests: int, threads: int):
+    """(wall seconds, per-request latencies, failures)"""
+    def one(_):
+        start = time.perf_counter()
+        ok = call()
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(requests)))
+    return time.perf_counter() - start, [r[0] for r in results], sum(1 for r in results if not r[1])
+
+
+def main(args):
+    state = MockState(args.latency, args.fail_rate, args.tokens)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    # Config reads these at import
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["MAX_CONCURRENT_REQUESTS"] = str(args.max_concurrent)
+    os.environ["AI_RETRY_BASE_DELAY"] = str(args.retry_base_delay)
+    from openai import OpenAI
+    import ai_core
+    from ai_core import FALLBACK_RESPONSE, generate_response, generate_response_chunks
+
+    sync_client = OpenAI(api_key="benchmark", base_url=base_url, timeout=30)
+    messages = [{"role": "user", "content": "hi"}]
+
+    def sync_call():
+        try:
+            if args.stream:
+                stream = sync_client.chat.completions.create(model="mock", messages=messages, stream=True)
+                "".join(c.choices[0].delta.content or "" for c in stream if c.choices)
+            else:
+                sync_client.chat.completions.create(model="mock", messages=messages)
+            return True
+        except Exception:
+            return False
+
+    def async_call():
+        if args.stream:
+            text = "".join(generate_response_chunks("hi", "neutral", "neutral"))
+        else:
+            text = generate_response("hi", "neutral", "neutral")
+        return text != FALLBACK_RESPONSE
+
+    print(f"{args.requests} {'streamed' if args.stream else 'plain'} requests from {args.threads} threads, "
+          f"{args.latency * 1000:.0f} ms server latency, {args.fail_rate:.0%} 503s, "
+          f"MAX_CONCURRENT_REQUESTS={ai_core.Config.MAX_CONCURRENT_REQUESTS}\n")
+    print(f"{'client':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'failed':>7} {'server peak':>12}")
+    for name, call in (("sync", sync_call), ("async", async_call)):
+        call()  # open connections
+        state.reset()
+        wall, latencies, failed = run(call, args.requests, args.threads)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{name:>6} {args.requests / wall:8.1f} {statistics.median(latencies) * 1000:8.0f} "
+              f"{p95 * 1000:8.0f} {failed:7d} {state.peak:12d}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=20, help="concurrent callers, like Socket.IO handler threads")
+    parser.add_argument("--latency", type=float, default=0.2, help="server seconds per request")
+    parser.add_argument("--tokens", type=int, default=30, help="words per response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--max-concurrent", type=int, default=5, help="MAX_CONCURRENT_REQUESTS for the async client")
+    parser.add_argument("--retry-base-delay", type=float, default=0.05)
+    parser.add_argument("--stream", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""
+Benchmark: frame acquisition, reopening the source per call vs the persistent FrameSource
+
+Runs headless against a video file or image directory; with no --source a
+short synthetic video is generated. Pass --source 0 to measure a real camera,
+where the per-call open cost is usually far higher than for files.
+
+Usage (from backend/):
+    python benchmarks/bench_frame_source.py --source path/to/clip.mp4 --iterations 100
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # only needed to import Config
+
+import cv2
+import numpy as np
+from frame_source import FrameSource, open_reader
+from _timing import report, time_calls
+
+
+def make_video(path: str, frames: int = 90, size=(640, 480)):
+    """Write a synthetic MJPG clip with a moving gradient"""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, size)
+    base = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    for i in range(frames):
+        shifted = np.roll(base, i * 7, axis=1)
+        writer.write(cv2.merge([shifted, np.flipud(shifted), np.full_like(shifted, i % 256)]))
+    writer.release()
+
+
+def open_read_release(source: str):
+    """What detect_emotion_sync used to do on every call"""
+    reader = open_reader(source)
+    try:
+        ret, frame = reader.read()
+        if not ret:
+            raise IOError("read failed")
+        return frame
+    finally:
+        reader.release()
+
+
+def main(args):
+    workdir = None
+    source = args.source
+    if source is None:
+        workdir = tempfile.mkdtemp(prefix="roomie_frames_")
+        source = os.path.join(workdir, "synthetic.avi")
+        make_video(source)
+        print(f"Generated synthetic clip at {source}")
+
+    print(f"\nSource: {source}")
+    report("open + read + release", time_calls(lambda: open_read_release(source), args.iterations), precision=3)
+
+    frames = FrameSource(source, fps=args.fps)
+    frames.start()
+    if frames.latest(timeout=5.0) is None:
+        print("FrameSource produced no frames")
+        frames.stop()
+        return
+
+    ages = []
+
+    def latest():
+        frame = frames.latest()
+        ages.append((time.monotonic() - frame.timestamp) * 1000)
+
+    report("FrameSource.latest()", time_calls(latest, args.iterations), precision=3)
+    print(f"  mean frame age {statistics.mean(ages):.1f} ms at {args.fps:g} fps pacing")
+    print(f"  {frames.stats()}")
+    frames.stop()
+
+    if workdir and not args.keep:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", help="video file, image directory or camera index")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--fps", type=float, default=30, help="pacing for file and directory sources")
+    parser.add_argument("--keep", action="store_true", help="keep the generated clip")
+    main(parser.parse_args())
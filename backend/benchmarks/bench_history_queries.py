@@ -0,0 +1,129 @@
+"""
+Benchmark: per-user history queries before and after the indexed schema
+
+Builds a database in the original layout (text timestamps, no secondary
+indexes), times the original get_recent_conversations/get_emotion_history
+queries, migrates it to the current schema and times the same calls
+through ConversationMemory.
+
+Usage (from backend/):
+    python benchmarks/bench_history_queries.py --rows 1000000 --users 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # only needed to import Config
+
+import aiosqlite
+from conversation_memory import ConversationMemory
+from migrations import apply_migrations
+from _timing import report, time_calls
+
+EMOTIONS = ["happy", "sad", "angry", "fear", "surprise", "neutral", "disgust"]
+
+# The queries as they were before the migration framework
+LEGACY_RECENT = """SELECT * FROM conversations
+                   WHERE user_id = ?
+                   ORDER BY timestamp DESC LIMIT ?"""
+LEGACY_HISTORY = """SELECT * FROM emotion_history
+                    WHERE user_id = ? AND timestamp > datetime('now', '-' || ? || ' hours')
+                    ORDER BY timestamp DESC"""
+
+
+def populate(db_path: str, rows: int, users: int, days: int):
+    """Fill both history tables with rows spread over the last N days"""
+    now = int(time.time())
+    span = days * 86400
+
+    def text_ts():
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - random.randrange(span)))
+
+    conn = sqlite3.connect(db_path)
+    batch = 50_000
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        conn.executemany(
+            """INSERT INTO conversations
+               (user_id, timestamp, user_message, bot_response, emotion, sentiment, personality)
+               VALUES (?, ?, 'hello there', 'hi! how are you?', ?, 'neutral', 'neutral')""",
+            ((random.randint(1, users), text_ts(), random.choice(EMOTIONS)) for _ in range(count))
+        )
+        conn.executemany(
+            """INSERT INTO emotion_history (user_id, timestamp, emotion, confidence, mood_state)
+               VALUES (?, ?, ?, ?, 'neutral')""",
+            ((random.randint(1, users), text_ts(), random.choice(EMOTIONS), random.random())
+             for _ in range(count))
+        )
+        conn.commit()
+    conn.close()
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="roomie_bench_")
+    db_path = os.path.join(workdir, "bench.db")
+
+    # Original layout
+    async with aiosqlite.connect(db_path) as db:
+        await apply_migrations(db, target=1)
+
+    print(f"Populating {args.rows:,} rows per table for {args.users} users...")
+    start = time.perf_counter()
+    populate(db_path, args.rows, args.users, args.days)
+    print(f"  done in {time.perf_counter() - start:.1f} s")
+
+    conn = sqlite3.connect(db_path)
+    print("\nOriginal schema (full table scans):")
+    report("get_recent_conversations(limit=50)", time_calls(
+        lambda: conn.execute(LEGACY_RECENT, (random.randint(1, args.users), 50)).fetchall(),
+        args.iterations
+    ))
+    report("get_emotion_history(hours=24)", time_calls(
+        lambda: conn.execute(LEGACY_HISTORY, (random.randint(1, args.users), 24)).fetchall(),
+        args.iterations
+    ))
+    conn.close()
+
+    memory = ConversationMemory(db_path)
+    start = time.perf_counter()
+    await memory.initialize()
+    print(f"\nMigration to current schema took {time.perf_counter() - start:.1f} s")
+
+    # Time the real code path, but keep the event loop cost out of the loop body
+    loop = asyncio.get_running_loop()
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    print("\nIndexed schema (epoch timestamps + composite indexes):")
+    recent = await loop.run_in_executor(None, time_calls, lambda: run(
+        memory.get_recent_conversations(random.randint(1, args.users), 50)
+    ), args.iterations)
+    report("get_recent_conversations(limit=50)", recent)
+    history = await loop.run_in_executor(None, time_calls, lambda: run(
+        memory.get_emotion_history(random.randint(1, args.users), 24)
+    ), args.iterations)
+    report("get_emotion_history(hours=24)", history)
+
+    await memory.close()
+    if not args.keep:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows per history table")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30, help="spread rows over this many days")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the generated database")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Benchmark: emotion inference throughput by micro-batch size
+
+Submits frames concurrently to an InferenceWorker configured with each batch
+size and reports frames per second. Needs DeepFace and its models; frames
+come from an image directory, or a synthetic frame is used.
+
+Usage (from backend/):
+    python benchmarks/bench_inference_batch.py --images path/to/faces --frames 64 --embed
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # only needed to import Config
+
+import cv2
+import numpy as np
+from frame_source import IMAGE_EXTENSIONS
+from inference_worker import InferenceWorker
+
+
+def load_frames(directory, count: int):
+    if directory:
+        paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        images = [cv2.imread(str(p)) for p in paths]
+        images = [img for img in images if img is not None]
+        if not images:
+            raise SystemExit(f"No readable images in {directory}")
+    else:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)]
+    return [images[i % len(images)] for i in range(count)]
+
+
+def run(worker: InferenceWorker, frames, embed: bool) -> float:
+    """Submit everything at once, as several users' streams would, and return frames/s"""
+    start = time.perf_counter()
+    futures = [worker.submit(frame, embed=embed) for frame in frames]
+    for future in futures:
+        future.result()
+    return len(frames) / (time.perf_counter() - start)
+
+
+def main(args):
+    frames = load_frames(args.images, args.frames)
+    print(f"{len(frames)} frames, embeddings {'on' if args.embed else 'off'}\n")
+
+    for batch_size in args.batch_sizes:
+        worker = InferenceWorker(max_batch=batch_size, max_wait=args.wait_ms / 1000)
+        run(worker, frames[:batch_size], args.embed)  # load models, warm up kernels
+        fps = run(worker, frames, args.embed)
+        stats = worker.stats()
+        print(f"  batch {batch_size:>3}   {fps:8.1f} frames/s   "
+              f"mean batch {stats['mean_batch_size']:.1f}   batched path {stats['batched']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", help="directory of face images")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--wait-ms", type=float, default=15)
+    parser.add_argument("--embed", action="store_true", help="also compute Facenet embeddings")
+    main(parser.parse_args())
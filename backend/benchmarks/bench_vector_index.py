@@ -0,0 +1,128 @@
+"""
+Benchmark: calibration matching, brute-force averaging vs the k-NN vector index
+
+Builds a synthetic user whose embeddings share one identity direction, with a
+smaller per-emotion offset and per-session drift, as recalibrating produces.
+Held-out samples from new sessions are matched with:
+  pairwise  - mean cosine per emotion, one pair at a time (the original loop)
+  centroid  - mean cosine per emotion as one product (CALIBRATION_KNN=0)
+  flat knn  - exact k-NN vote
+  ivf knn   - k-NN vote over the clustered index
+and the latency per query and accuracy are reported for each sample count
+(pairwise is slow, so it runs on a tenth of the queries).
+
+Usage (from backend/):
+    python benchmarks/bench_vector_index.py --per-emotion 20 200 1000 --queries 300
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")  # only needed to import Config
+
+import numpy as np
+from vector_index import VectorIndex
+from emotion_calibration import CalibrationSet
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+
+def make_user(rng, dim: int, per_emotion: int, sessions: int, queries: int):
+    """(samples by emotion, query vectors, query labels)"""
+    identity = rng.normal(size=dim) * 3.0
+    offsets = rng.normal(size=(len(EMOTIONS), dim)) * 0.25
+    # Each expression is made a few different ways
+    modes = rng.normal(size=(len(EMOTIONS), 4, dim)) * 0.8
+
+    def sample(label, session_drift):
+        mode = modes[label, rng.integers(modes.shape[1])]
+        return identity + offsets[label] + mode + session_drift + rng.normal(size=dim) * 0.8
+
+    drifts = rng.normal(size=(sessions, dim)) * 0.5
+    samples = {
+        emotion: [sample(label, drifts[rng.integers(sessions)]) for _ in range(per_emotion)]
+        for label, emotion in enumerate(EMOTIONS)
+    }
+    labels = rng.integers(len(EMOTIONS), size=queries)
+    vectors = [sample(label, rng.normal(size=dim) * 0.5) for label in labels]
+    return samples, vectors, labels
+
+
+def pairwise_match(samples, vector):
+    """The original per-pair loop"""
+    best, best_similarity = None, 0.0
+    for emotion, embeddings in samples.items():
+        similarity = np.mean([
+            np.dot(vector, e) / (np.linalg.norm(vector) * np.linalg.norm(e)) for e in embeddings
+        ])
+        if similarity > best_similarity:
+            best, best_similarity = emotion, similarity
+    return best
+
+
+def timed(match, vectors, labels, limit=None):
+    """(microseconds per query, accuracy)"""
+    vectors, labels = vectors[:limit], labels[:limit]
+    start = time.perf_counter()
+    predictions = [match(v) for v in vectors]
+    elapsed = time.perf_counter() - start
+    correct = sum(p == EMOTIONS[label] for p, label in zip(predictions, labels))
+    return elapsed / len(vectors) * 1e6, correct / len(vectors)
+
+
+def ivf_recall(rows, vectors, k: int, nprobe: int) -> float:
+    """Share of the exact top-k that the IVF search also returns"""
+    exact = VectorIndex(rows.shape[1], ivf_threshold=len(rows) + 1)
+    approx = VectorIndex(rows.shape[1], ivf_threshold=1, nprobe=nprobe)
+    ids = np.arange(len(rows))
+    exact.add(rows, ids)
+    approx.add(rows, ids)
+    hits = 0
+    for vector in vectors:
+        hits += len(np.intersect1d(exact.search(vector, k)[1], approx.search(vector, k)[1]))
+    return hits / (k * len(vectors))
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"{len(EMOTIONS)} emotions, {args.dim}-d, k={args.k}, nprobe={args.nprobe}\n")
+    print(f"{'per emotion':>11} {'method':>9} {'us/query':>10} {'accuracy':>9}")
+
+    for per_emotion in args.per_emotion:
+        samples, vectors, labels = make_user(rng, args.dim, per_emotion, args.sessions, args.queries)
+        centroid = CalibrationSet(samples, knn=0)
+        rows = np.asarray([v for vs in samples.values() for v in vs], dtype=np.float32)
+        row_labels = np.repeat(np.arange(len(EMOTIONS)), per_emotion)
+        flat = VectorIndex(args.dim, ivf_threshold=len(rows) + 1)
+        ivf = VectorIndex(args.dim, ivf_threshold=1, nprobe=args.nprobe)
+        flat.add(rows, row_labels)
+        ivf.add(rows, row_labels)
+
+        def vote(index):
+            return lambda v: EMOTIONS[label] if (label := index.vote(v, args.k)[0]) is not None else None
+
+        methods = [
+            ("pairwise", lambda v: pairwise_match(samples, v), max(10, args.queries // 10)),
+            ("centroid", lambda v: centroid.match(v)[0], None),
+            ("flat knn", vote(flat), None),
+            ("ivf knn", vote(ivf), None),
+        ]
+        for name, match, limit in methods:
+            us, accuracy = timed(match, vectors, labels, limit)
+            print(f"{per_emotion:>11} {name:>9} {us:10.1f} {accuracy:9.1%}")
+        print(f"{'':>11} ivf recall@{args.k} vs exact: {ivf_recall(rows, vectors, args.k, args.nprobe):.1%}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--per-emotion", type=int, nargs="+", default=[20, 200, 1000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
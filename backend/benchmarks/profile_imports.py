@@ -0,0 +1,75 @@
+"""
+Profile: import time of the backend, from python -X importtime
+
+Imports a module (app by default) in a fresh interpreter with model warm-up
+off, then reports the total and the slowest imports by cumulative time, and
+whether any heavy ML package was pulled in at import time. Runs in a scratch
+directory so the database, audio and log files don't touch the checkout.
+
+Usage (from backend/):
+    python benchmarks/profile_imports.py --module app --top 25
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_PACKAGES = ("deepface", "tensorflow", "keras", "transformers", "torch")
+
+
+def profile(module: str):
+    """Return (wall seconds, [(cumulative_us, self_us, name)]) for importing module"""
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(BACKEND_DIR),
+            MODEL_WARMUP="False",
+            DB_PATH=os.path.join(scratch, "profile.db"),
+            AUDIO_DIR=os.path.join(scratch, "audio")
+        )
+        env.setdefault("OPENAI_API_KEY", "profile")  # only needed to import Config
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=scratch, env=env, capture_output=True, text=True
+        )
+        wall = time.perf_counter() - start
+
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        tail = "\n".join(errors[-15:])
+        raise SystemExit(f"import {module} failed:\n{tail}")
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return wall, rows
+
+
+def main(args):
+    wall, rows = profile(args.module)
+    top_level = [row for row in rows if not row[2].startswith(" ")]
+    total_us = sum(row[0] for row in top_level)
+
+    print(f"import {args.module}: {total_us / 1e6:.2f} s in imports, {wall:.2f} s interpreter wall time\n")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name.strip()}")
+
+    loaded = sorted({name.strip().split(".")[0] for _, _, name in rows} & set(HEAVY_PACKAGES))
+    print(f"\nHeavy packages imported eagerly: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app", help="module to import, as from backend/")
+    parser.add_argument("--top", type=int, default=25, help="number of slowest imports to list")
+    main(parser.parse_args())
@@ -11,6 +11,7 @@ class Config:
     
     # API Keys
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # an OpenAI-compatible server; unset for api.openai.com
     
     # Server Settings
     HOST = os.getenv("HOST", "127.0.0.1")
@@ -21,27 +22,64 @@ class Config:
     EMOTION_CACHE_TTL = int(os.getenv("EMOTION_CACHE_TTL", 8))  # seconds
     EMOTION_DETECTOR_BACKEND = os.getenv("EMOTION_DETECTOR_BACKEND", "opencv")  # faster than retinaface
     EMOTION_CONFIDENCE_THRESHOLD = float(os.getenv("EMOTION_CONFIDENCE_THRESHOLD", 0.70))  # Increased for accuracy
+    EMOTION_SMOOTHING_HALF_LIFE = float(os.getenv("EMOTION_SMOOTHING_HALF_LIFE", 4.0))  # seconds for a frame's weight to halve
+    EMOTION_HYSTERESIS = float(os.getenv("EMOTION_HYSTERESIS", 0.10))  # lead a new emotion needs before the state switches
+    EMOTION_PUSH_BUCKET = float(os.getenv("EMOTION_PUSH_BUCKET", 0.10))  # confidence steps that count as a change worth pushing
+    EMOTION_PUSH_DEBOUNCE = float(os.getenv("EMOTION_PUSH_DEBOUNCE", 0.5))  # seconds between pushes to one room
+    EMOTION_MONITOR_INTERVAL = float(os.getenv("EMOTION_MONITOR_INTERVAL", 3.0))  # seconds between detections
+    EMOTION_MONITOR_MAX_INTERVAL = float(os.getenv("EMOTION_MONITOR_MAX_INTERVAL", 15.0))  # backoff cap while stable
+    INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", 8))  # frames per model forward pass
+    INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread").lower()  # "thread" or "process"
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 2))  # model processes in process mode
+    INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 30))  # a batch slower than this restarts its process
+    INFERENCE_STARTUP_TIMEOUT = float(os.getenv("INFERENCE_STARTUP_TIMEOUT", 180))  # model load allowance
+    CALIBRATION_KNN = int(os.getenv("CALIBRATION_KNN", 5))  # neighbours voting on a calibrated match; 0 averages per emotion
+    VECTOR_INDEX_IVF_THRESHOLD = int(os.getenv("VECTOR_INDEX_IVF_THRESHOLD", 2048))  # samples before a user's index clusters
+    VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 4))  # clusters scanned per query
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "True").lower() == "true"  # load models in the background at startup
+    INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", 15))  # wait this long to fill a batch
+    CLIENT_FRAME_WORKERS = int(os.getenv("CLIENT_FRAME_WORKERS", 8))  # browser frames analyzed at once
+    MAX_FRAME_BYTES = int(os.getenv("MAX_FRAME_BYTES", 512 * 1024))  # larger pushed frames are dropped
+    MOTION_GATE_ENABLED = os.getenv("MOTION_GATE_ENABLED", "True").lower() == "true"  # skip inference on static scenes
+    MOTION_DIFF_THRESHOLD = float(os.getenv("MOTION_DIFF_THRESHOLD", 6.0))  # mean gray-level change that counts as motion
+    MOTION_FACE_CHECK = os.getenv("MOTION_FACE_CHECK", "True").lower() == "true"  # skip frames with no face
+    MOTION_MAX_SKIP_SECONDS = float(os.getenv("MOTION_MAX_SKIP_SECONDS", 30))  # always re-run after this long
+    CAMERA_SOURCE = os.getenv("CAMERA_SOURCE", "0")  # camera index, video file/URL or image directory
+    CAMERA_FPS = float(os.getenv("CAMERA_FPS", 15))  # pacing for file and directory sources
+    CAMERA_MAX_FRAME_AGE = float(os.getenv("CAMERA_MAX_FRAME_AGE", 2.0))  # seconds before a frame is stale
     
     # AI Settings
     AI_MODEL = os.getenv("AI_MODEL", "gpt-4o-mini")
     AI_TEMPERATURE = float(os.getenv("AI_TEMPERATURE", 0.9))
     AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", 150))
     CONVERSATION_CONTEXT_LENGTH = int(os.getenv("CONVERSATION_CONTEXT_LENGTH", 50))
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 2000))  # system prompt + history + message
+    PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", 120))  # note standing in for trimmed history
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "True").lower() == "true"  # emit message_chunk events
     
     # TTS Settings
     TTS_MODEL = os.getenv("TTS_MODEL", "tts-1")  # or "tts-1-hd" for higher quality
     TTS_SPEED = float(os.getenv("TTS_SPEED", 1.0))
+    TTS_SENTENCE_PIPELINE = os.getenv("TTS_SENTENCE_PIPELINE", "True").lower() == "true"  # speak while streaming
+    TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", 3))  # concurrent sentence syntheses
+    TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", 20))  # shorter sentences are merged
     
     # Audio Settings
-    AUDIO_CLEANUP_DELAY = int(os.getenv("AUDIO_CLEANUP_DELAY", 30))  # seconds
+    TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", 200))  # LRU-evicted beyond this
     AUDIO_DIR = os.getenv("AUDIO_DIR", "audio")
     
     # Database
     DB_PATH = os.getenv("DB_PATH", "roomie_data.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))  # most connections (and threads) open at once
+    CONTEXT_CACHE_MAX_MB = int(os.getenv("CONTEXT_CACHE_MAX_MB", 64))  # per-user context buffers
+    ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", 300))  # seconds; writes invalidate sooner
     
     # Performance
     MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 5))
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
+    AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 3))  # extra attempts after a transient AI API failure
+    AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", 0.5))  # seconds; backoff doubles per attempt, with jitter
+    AI_RETRY_MAX_DELAY = float(os.getenv("AI_RETRY_MAX_DELAY", 8.0))
     
     # Voice Map
     VOICE_MAP = {
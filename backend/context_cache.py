@@ -0,0 +1,146 @@
+"""
+Per-user in-memory conversation context for ROOMie
+Keeps each active user's most recent exchanges so building the AI
+context doesn't need a database round trip
+"""
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from logger import setup_logger
+
+logger = setup_logger("context_cache")
+
+# Rough per-exchange bookkeeping cost on top of the message text
+EXCHANGE_OVERHEAD_BYTES = 200
+
+
+class _UserContext:
+    """Ring buffer of one user's recent (row_id, user_message, bot_response) exchanges"""
+
+    __slots__ = ("exchanges", "size_bytes")
+
+    def __init__(self, capacity: int):
+        self.exchanges: Deque[Tuple[int, str, str]] = deque(maxlen=capacity)
+        self.size_bytes = 0
+
+    def append(self, row_id: int, user_message: str, bot_response: str) -> int:
+        """Add an exchange and return the change in estimated size"""
+        before = self.size_bytes
+        if self.exchanges and row_id <= self.exchanges[-1][0]:
+            # Already picked up by the load that warmed this buffer
+            return 0
+        if len(self.exchanges) == self.exchanges.maxlen:
+            _, old_user, old_bot = self.exchanges[0]
+            self.size_bytes -= len(old_user) + len(old_bot) + EXCHANGE_OVERHEAD_BYTES
+        self.exchanges.append((row_id, user_message, bot_response))
+        self.size_bytes += len(user_message) + len(bot_response) + EXCHANGE_OVERHEAD_BYTES
+        return self.size_bytes - before
+
+
+class ConversationContextCache:
+    """
+    Bounded per-user ring buffers of recent exchanges.
+    Users are evicted least recently used first once the memory cap is hit.
+    """
+
+    def __init__(self, capacity: int, max_bytes: int):
+        self.capacity = capacity  # exchanges kept per user
+        self.max_bytes = max_bytes
+        self._users: "OrderedDict[int, _UserContext]" = OrderedDict()
+        # Bumped on every write so a slow DB load can't overwrite newer data
+        self._generations: Dict[int, int] = {}
+        self._total_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self, user_id: int) -> int:
+        """Token to pass to load() for a read that started now"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, user_id: int, max_exchanges: int) -> Optional[List[Dict]]:
+        """Return the last N exchanges formatted for the AI, or None on a miss"""
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or max_exchanges > self.capacity:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            exchanges = list(entry.exchanges)[-max_exchanges:] if max_exchanges > 0 else []
+
+        context = []
+        for _, user_message, bot_response in exchanges:
+            context.append({"role": "user", "content": user_message})
+            context.append({"role": "assistant", "content": bot_response})
+        return context
+
+    def load(self, user_id: int, exchanges: Iterable[Tuple[int, str, str]], generation: int):
+        """Replace a user's buffer with exchanges read from the DB (oldest first)"""
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                # A write landed while we were reading; the next read reloads
+                return
+            self._drop(user_id)
+            entry = _UserContext(self.capacity)
+            for row_id, user_message, bot_response in exchanges:
+                entry.append(row_id, user_message, bot_response)
+            self._users[user_id] = entry
+            self._total_bytes += entry.size_bytes
+            self._evict(keep=user_id)
+
+    def append(self, user_id: int, row_id: int, user_message: str, bot_response: str):
+        """Write-through for a newly stored exchange; cold users stay cold"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            entry = self._users.get(user_id)
+            if entry is None:
+                return
+            self._users.move_to_end(user_id)
+            self._total_bytes += entry.append(row_id, user_message, bot_response)
+            self._evict(keep=user_id)
+
+    def invalidate(self, user_id: int):
+        """Forget a user's buffer"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._drop(user_id)
+
+    def clear(self):
+        """Forget every buffer"""
+        with self._lock:
+            for user_id in self._users:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._users.clear()
+            self._total_bytes = 0
+
+    def _drop(self, user_id: int):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self._total_bytes -= entry.size_bytes
+
+    def _evict(self, keep: int):
+        """Drop least recently used users until under the cap; caller holds the lock"""
+        while self._total_bytes > self.max_bytes and len(self._users) > 1:
+            user_id = next(iter(self._users))
+            if user_id == keep:
+                self._users.move_to_end(user_id)
+                continue
+            self._drop(user_id)
+            self.evictions += 1
+            logger.debug(f"Evicted conversation context for user {user_id}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._users),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
@@ -1,118 +1,76 @@
 """
 Conversation memory and history management for ROOMie
 """
-import aiosqlite
 import json
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+from typing import Callable, List, Dict, Optional
 from pathlib import Path
+from db_pool import ConnectionPool
+from migrations import apply_migrations
+from context_cache import ConversationContextCache
+from config import Config
 from logger import setup_logger
 
 logger = setup_logger("conversation_memory")
 
+# Timestamps are stored as epoch seconds; history payloads keep the
+# "YYYY-MM-DD HH:MM:SS" (UTC) text the frontend and analytics expect
+CONVERSATION_COLUMNS = (
+    "id, user_id, datetime(timestamp, 'unixepoch') AS timestamp, "
+    "user_message, bot_response, emotion, sentiment, personality"
+)
+EMOTION_HISTORY_COLUMNS = (
+    "id, user_id, datetime(timestamp, 'unixepoch') AS timestamp, "
+    "emotion, confidence, mood_state"
+)
+
+# Pre-aggregated emotion counts: granularity -> (table, bucket width in seconds)
+ROLLUP_TABLES = {
+    "hour": ("emotion_rollup_hourly", 3600),
+    "day": ("emotion_rollup_daily", 86400),
+}
+ROLLUP_UPSERT = """INSERT INTO {table} (user_id, bucket, emotion, count, confidence_sum)
+                   VALUES (?, ?, ?, 1, ?)
+                   ON CONFLICT (user_id, bucket, emotion) DO UPDATE SET
+                       count = count + 1,
+                       confidence_sum = confidence_sum + excluded.confidence_sum"""
+
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class ConversationMemory:
     """Manages conversation history and emotion tracking"""
     
-    def __init__(self, db_path: str = "roomie_data.db"):
+    def __init__(self, db_path: str = "roomie_data.db", pool_size: int = Config.DB_POOL_SIZE):
         self.db_path = db_path
-        self.conversation_context = []
-        self.emotion_history = []
+        self.pool = ConnectionPool(db_path, size=pool_size)
+        # Recent exchanges per user, kept in sync by add_conversation
+        self.context_cache = ConversationContextCache(
+            capacity=Config.CONVERSATION_CONTEXT_LENGTH,
+            max_bytes=Config.CONTEXT_CACHE_MAX_MB * 1024 * 1024
+        )
+        # Called with a user_id after that user's history changes, or None for everyone
+        self._write_listeners: List[Callable[[Optional[int]], None]] = []
         
-    async def initialize(self):
-        """Initialize database tables"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Users table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Check if password_hash column exists (migration)
-            async with db.execute("PRAGMA table_info(users)") as cursor:
-                columns = [row[1] for row in await cursor.fetchall()]
-                if "password_hash" not in columns:
-                    logger.info("Migrating users table to include password_hash")
-                    await db.execute("ALTER TABLE users ADD COLUMN password_hash TEXT")
+    def add_write_listener(self, listener: Callable[[Optional[int]], None]):
+        """Register a callback for invalidating data derived from stored history"""
+        self._write_listeners.append(listener)
 
-            # Conversations table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    user_message TEXT NOT NULL,
-                    bot_response TEXT NOT NULL,
-                    emotion TEXT,
-                    sentiment TEXT,
-                    personality TEXT,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            """)
-            
-            # Check if user_id column exists in conversations (migration)
-            async with db.execute("PRAGMA table_info(conversations)") as cursor:
-                columns = [row[1] for row in await cursor.fetchall()]
-                if "user_id" not in columns:
-                    logger.info("Migrating conversations table to include user_id")
-                    await db.execute("ALTER TABLE conversations ADD COLUMN user_id INTEGER")
-
-            # Emotion history table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS emotion_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    emotion TEXT NOT NULL,
-                    confidence REAL,
-                    mood_state TEXT,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            """)
+    def _notify_write(self, user_id: Optional[int]):
+        for listener in self._write_listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.error(f"Write listener error: {e}")
 
-            # Check if user_id column exists in emotion_history (migration)
-            async with db.execute("PRAGMA table_info(emotion_history)") as cursor:
-                columns = [row[1] for row in await cursor.fetchall()]
-                if "user_id" not in columns:
-                    logger.info("Migrating emotion_history table to include user_id")
-                    await db.execute("ALTER TABLE emotion_history ADD COLUMN user_id INTEGER")
-            
-            # User preferences table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_preferences (
-                    user_id INTEGER,
-                    key TEXT,
-                    value TEXT,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, key),
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            """)
-            
-            # Emotion calibration table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS emotion_calibration (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    emotion TEXT NOT NULL,
-                    embedding TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            """)
-            
-            await db.commit()
-            logger.info("Database initialized successfully")
+    async def initialize(self):
+        """Create or upgrade database tables"""
+        async with self.pool.acquire() as db:
+            version = await apply_migrations(db)
+            logger.info(f"Database initialized successfully (schema v{version})")
 
     async def create_user(self, username: str, password: str) -> int:
         """Create a new user with password"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             try:
                 password_hash = generate_password_hash(password)
                 cursor = await db.execute(
@@ -128,7 +86,7 @@ class ConversationMemory:
 
     async def verify_user(self, username: str, password: str) -> Optional[int]:
         """Verify user credentials and return user ID"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             async with db.execute(
                 "SELECT id, password_hash FROM users WHERE username = ?", 
                 (username,)
@@ -154,7 +112,7 @@ class ConversationMemory:
 
     async def get_user_by_username(self, username: str) -> Optional[int]:
         """Get user ID by username (internal use)"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             async with db.execute("SELECT id FROM users WHERE username = ?", (username,)) as cursor:
                 row = await cursor.fetchone()
                 return row[0] if row else None
@@ -169,32 +127,18 @@ class ConversationMemory:
         personality: str = "neutral"
     ):
         """Store a conversation exchange"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
+        async with self.pool.acquire() as db:
+            cursor = await db.execute(
                 """INSERT INTO conversations 
-                   (user_id, user_message, bot_response, emotion, sentiment, personality)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (user_id, user_message, bot_response, emotion, sentiment, personality)
+                   (user_id, timestamp, user_message, bot_response, emotion, sentiment, personality)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (user_id, int(time.time()), user_message, bot_response, emotion, sentiment, personality)
             )
             await db.commit()
         
-        # Update in-memory context (per user context management could be added here)
-        # For now, we'll just append to the global context but ideally this should be per-user
-        # or we fetch from DB when needed.
-        self.conversation_context.append({
-            "role": "user",
-            "content": user_message,
-            "timestamp": datetime.now().isoformat()
-        })
-        self.conversation_context.append({
-            "role": "assistant",
-            "content": bot_response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Keep only last N messages
-        if len(self.conversation_context) > 20:
-            self.conversation_context = self.conversation_context[-20:]
+        # Write-through to the per-user context cache
+        self.context_cache.append(user_id, cursor.lastrowid, user_message, bot_response)
+        self._notify_write(user_id)
         
         logger.debug(f"Conversation stored for user {user_id}")
     
@@ -205,55 +149,99 @@ class ConversationMemory:
         confidence: float = 0.0,
         mood_state: str = "neutral"
     ):
-        """Store emotion detection record"""
-        async with aiosqlite.connect(self.db_path) as db:
+        """Store emotion detection record and update the rollups in the same transaction"""
+        now = int(time.time())
+        async with self.pool.acquire() as db:
             await db.execute(
-                """INSERT INTO emotion_history (user_id, emotion, confidence, mood_state)
-                   VALUES (?, ?, ?, ?)""",
-                (user_id, emotion, confidence, mood_state)
+                """INSERT INTO emotion_history (user_id, timestamp, emotion, confidence, mood_state)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (user_id, now, emotion, confidence, mood_state)
             )
+            for table, bucket_seconds in ROLLUP_TABLES.values():
+                await db.execute(
+                    ROLLUP_UPSERT.format(table=table),
+                    (user_id, now - now % bucket_seconds, emotion, confidence or 0.0)
+                )
             await db.commit()
+        self._notify_write(user_id)
     
     async def get_recent_conversations(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Retrieve recent conversations for a user"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.acquire() as db:
             async with db.execute(
-                """SELECT * FROM conversations 
+                f"""SELECT {CONVERSATION_COLUMNS} FROM conversations 
                    WHERE user_id = ?
-                   ORDER BY timestamp DESC LIMIT ?""",
+                   ORDER BY conversations.timestamp DESC, id DESC LIMIT ?""",
                 (user_id, limit)
             ) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
     
+    async def count_recent_conversations(self, user_id: int, limit: int = 50) -> int:
+        """Count a user's conversations, stopping at limit"""
+        async with self.pool.acquire() as db:
+            async with db.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM conversations WHERE user_id = ? LIMIT ?)",
+                (user_id, limit)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0]
+    
     async def get_emotion_history(self, user_id: int, hours: int = 24) -> List[Dict]:
         """Get emotion history for the last N hours for a user"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.acquire() as db:
             async with db.execute(
-                """SELECT * FROM emotion_history 
-                   WHERE user_id = ? AND timestamp > datetime('now', '-' || ? || ' hours')
-                   ORDER BY timestamp DESC""",
-                (user_id, hours)
+                f"""SELECT {EMOTION_HISTORY_COLUMNS} FROM emotion_history 
+                   WHERE user_id = ? AND emotion_history.timestamp > ?
+                   ORDER BY emotion_history.timestamp DESC, id DESC""",
+                (user_id, int(time.time()) - hours * 3600)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+    
+    async def get_emotion_rollups(self, user_id: int, since: int, granularity: str = "hour") -> List[Dict]:
+        """Get per-emotion counts for buckets starting at or after the bucket containing `since`"""
+        table, bucket_seconds = ROLLUP_TABLES[granularity]
+        async with self.pool.acquire() as db:
+            async with db.execute(
+                f"""SELECT bucket, emotion, count, confidence_sum FROM {table}
+                    WHERE user_id = ? AND bucket >= ?
+                    ORDER BY bucket""",
+                (user_id, since - since % bucket_seconds)
             ) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
     
     async def get_context_for_ai(self, user_id: int, max_messages: int = 10) -> List[Dict]:
-        """Get conversation context formatted for AI from DB"""
-        # Fetch from DB instead of memory to ensure user isolation
-        recent = await self.get_recent_conversations(user_id, max_messages)
-        # Convert to AI format (reverse order because get_recent returns DESC)
+        """Get conversation context formatted for AI, from the per-user cache when warm"""
+        context = self.context_cache.get(user_id, max_messages)
+        if context is not None:
+            return context
+
+        # Miss: read enough to fill the user's buffer, then serve from it
+        generation = self.context_cache.generation(user_id)
+        limit = max(max_messages, self.context_cache.capacity)
+        recent = await self.get_recent_conversations(user_id, limit)
+        # Reverse because get_recent returns DESC
+        exchanges = [
+            (row["id"], row["user_message"], row["bot_response"]) for row in reversed(recent)
+        ]
+        if max_messages <= self.context_cache.capacity:
+            self.context_cache.load(user_id, exchanges, generation)
+
         context = []
-        for row in reversed(recent):
-            context.append({"role": "user", "content": row["user_message"]})
-            context.append({"role": "assistant", "content": row["bot_response"]})
+        for _, user_message, bot_response in exchanges[-max_messages:] if max_messages > 0 else []:
+            context.append({"role": "user", "content": user_message})
+            context.append({"role": "assistant", "content": bot_response})
         return context
+
+    async def warm_context(self, user_id: int):
+        """Preload a user's context cache, e.g. on login"""
+        await self.get_context_for_ai(user_id, self.context_cache.capacity)
     
     async def set_preference(self, user_id: int, key: str, value: str):
         """Store user preference"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             await db.execute(
                 """INSERT OR REPLACE INTO user_preferences (user_id, key, value, updated_at)
                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
@@ -264,7 +252,7 @@ class ConversationMemory:
     
     async def get_preference(self, user_id: int, key: str, default: Optional[str] = None) -> Optional[str]:
         """Retrieve user preference"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             async with db.execute(
                 "SELECT value FROM user_preferences WHERE user_id = ? AND key = ?",
                 (user_id, key)
@@ -274,27 +262,42 @@ class ConversationMemory:
     
     async def clear_old_data(self, days: int = 30):
         """Clean up old conversation data"""
-        async with aiosqlite.connect(self.db_path) as db:
+        cutoff = int(time.time()) - days * 86400
+        async with self.pool.acquire() as db:
             await db.execute(
-                """DELETE FROM conversations 
-                   WHERE timestamp < datetime('now', '-' || ? || ' days')""",
-                (days,)
+                "DELETE FROM conversations WHERE timestamp < ?",
+                (cutoff,)
             )
             await db.execute(
-                """DELETE FROM emotion_history 
-                   WHERE timestamp < datetime('now', '-' || ? || ' days')""",
-                (days,)
+                "DELETE FROM emotion_history WHERE timestamp < ?",
+                (cutoff,)
             )
+            # Drop buckets that end before the cutoff
+            for table, bucket_seconds in ROLLUP_TABLES.values():
+                await db.execute(
+                    f"DELETE FROM {table} WHERE bucket <= ?",
+                    (cutoff - bucket_seconds,)
+                )
             await db.commit()
+        self.context_cache.clear()
+        self._notify_write(None)
         logger.info(f"Cleaned up data older than {days} days")
 
     async def clear_user_history(self, user_id: int):
         """Clear all history for a specific user"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.acquire() as db:
             await db.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
             await db.execute("DELETE FROM emotion_history WHERE user_id = ?", (user_id,))
+            for table, _ in ROLLUP_TABLES.values():
+                await db.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
             await db.commit()
+        self.context_cache.invalidate(user_id)
+        self._notify_write(user_id)
         logger.info(f"Cleared history for user {user_id}")
 
+    async def close(self):
+        """Close pooled database connections"""
+        await self.pool.close()
+
 # Global instance
 memory = ConversationMemory()
@@ -0,0 +1,149 @@
+"""
+Shared SQLite connection pool for ROOMie
+"""
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+import aiosqlite
+from logger import setup_logger
+
+logger = setup_logger("db_pool")
+
+# Applied once to every connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers don't block the writer
+    "PRAGMA synchronous=NORMAL",    # safe with WAL, far fewer fsyncs
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",      # ~8 MB page cache per connection
+    "PRAGMA busy_timeout=5000",     # wait for the write lock instead of failing
+)
+
+
+class ConnectionPool:
+    """
+    Small pool of long-lived aiosqlite connections.
+
+    Each aiosqlite connection owns a worker thread, so reusing them avoids a
+    thread start and file open per query. At most `size` connections (and
+    threads) exist at once; further callers wait for one to be returned.
+    Connections keep a per-connection prepared statement cache, so repeated
+    queries skip SQL compilation.
+    The pool is not tied to an event loop and can be shared by callers
+    running on different loops.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, statement_cache_size: int = 128):
+        self.db_path = db_path
+        self.size = size
+        self.statement_cache_size = statement_cache_size
+        self._idle: List[aiosqlite.Connection] = []
+        self._checked_out = 0
+        # Callers waiting for a free slot, woken on their own loop in arrival order
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open and configure a new connection"""
+        db = await aiosqlite.connect(
+            self.db_path,
+            cached_statements=self.statement_cache_size
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            await db.execute(pragma)
+        db.row_factory = aiosqlite.Row
+        logger.debug(f"Opened pooled connection to {self.db_path}")
+        return db
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a connection for the duration of the block, waiting while all are in use"""
+        db = await self._checkout()
+        try:
+            if db is None:
+                db = await self._connect()
+            yield db
+        finally:
+            await self._release(db)
+
+    async def _checkout(self) -> Optional[aiosqlite.Connection]:
+        """Claim a slot; returns an idle connection, or None to open a new one"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._checked_out < self.size:
+                    self._checked_out += 1
+                    return self._idle.pop() if self._idle else None
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._waiters.remove((loop, waiter))
+                    except ValueError:
+                        # Already woken for a free slot; pass that on to the next caller
+                        self._wake_next()
+                raise
+
+    def _wake_next(self):
+        """Wake the longest waiting caller; caller holds the lock"""
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+                return
+            except RuntimeError:
+                continue  # that caller's loop has closed
+
+    async def _release(self, db: Optional[aiosqlite.Connection]):
+        """Return a connection to the pool, or close it if the pool is closed"""
+        try:
+            # Never hand an open transaction to the next caller
+            if db is not None and db.in_transaction:
+                await db.rollback()
+        except Exception as e:
+            logger.error(f"Error resetting pooled connection: {e}")
+            await self._close_quietly(db)
+            db = None
+
+        with self._lock:
+            self._checked_out -= 1
+            self._wake_next()
+            if db is None:
+                return
+            if not self._closed:
+                self._idle.append(db)
+                return
+
+        await self._close_quietly(db)
+
+    async def _close_quietly(self, db: aiosqlite.Connection):
+        try:
+            await db.close()
+        except Exception as e:
+            logger.error(f"Error closing pooled connection: {e}")
+
+    async def close(self):
+        """Close all idle connections and refuse new checkouts"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            # Waiters see the pool is closed and raise
+            while self._waiters:
+                self._wake_next()
+
+        for db in idle:
+            await self._close_quietly(db)
+        logger.info(f"Connection pool for {self.db_path} closed")
+
+
+def _resolve(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
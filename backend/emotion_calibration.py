@@ -4,20 +4,121 @@ Allows users to calibrate emotion detection to their specific facial expressions
 """
 import cv2
 import numpy as np
-from deepface import DeepFace
-import json
-import aiosqlite
+import asyncio
 from typing import List, Dict, Optional, Tuple
+from db_pool import ConnectionPool
+from inference_worker import inference_worker, EMBEDDING_MODEL
+from conversation_memory import memory
+from migrations import EMBEDDING_DTYPE
+from vector_index import VectorIndex, normalize
 from logger import setup_logger
 from config import Config
 
 logger = setup_logger("emotion_calibration")
 
+MATCH_THRESHOLD = 0.7  # similarity a personalized match must exceed
+
+
+class CalibrationSet:
+    """
+    One user's calibration samples in a VectorIndex of L2-normalized float32
+    rows labelled by emotion, plus a running sum of the rows per emotion.
+    Matching is a k-NN vote over the index; with knn=0 it is each emotion's
+    mean cosine similarity, which is a normalized query dotted with the
+    emotion's mean row.
+    """
+    
+    def __init__(self, samples: Dict[str, List[np.ndarray]], knn: int = Config.CALIBRATION_KNN):
+        self.knn = knn
+        self.emotions: List[str] = []
+        self.index: Optional[VectorIndex] = None
+        self._label_ids: Dict[str, int] = {}
+        self._sums = np.empty((0, 0), dtype=np.float32)
+        self._counts = np.empty(0, dtype=np.int64)
+        for emotion, vectors in samples.items():
+            if len(vectors):
+                self.add(emotion, vectors)
+    
+    def __bool__(self) -> bool:
+        return bool(self.emotions)
+    
+    @property
+    def dim(self) -> int:
+        return self.index.dim if self.index is not None else 0
+    
+    def add(self, emotion: str, vectors):
+        """Insert one or more samples of an emotion"""
+        rows = normalize(np.asarray(vectors, dtype=np.float32))
+        if rows.ndim == 1:
+            rows = rows[np.newaxis]
+        if self.index is None:
+            self.index = VectorIndex(rows.shape[1])
+            self._sums = np.empty((0, rows.shape[1]), dtype=np.float32)
+        
+        label = self._label_ids.get(emotion)
+        if label is None:
+            label = self._label_ids[emotion] = len(self.emotions)
+            self.emotions.append(emotion)
+            self._sums = np.vstack([self._sums, np.zeros((1, self.dim), dtype=np.float32)])
+            self._counts = np.append(self._counts, 0)
+        
+        self.index.add(rows, np.full(len(rows), label))
+        self._sums[label] += rows.sum(axis=0)
+        self._counts[label] += len(rows)
+    
+    def match(self, vector) -> Tuple[Optional[str], float]:
+        """Best emotion and its similarity; (None, 0.0) when nothing is positively similar"""
+        if not self.emotions:
+            return None, 0.0
+        if self.knn > 0:
+            label, similarity = self.index.vote(vector, self.knn)
+            return (self.emotions[label], similarity) if label is not None else (None, 0.0)
+        
+        query = normalize(np.asarray(vector, dtype=np.float32).reshape(self.dim))
+        scores = (self._sums @ query) / self._counts
+        best = int(np.argmax(scores))
+        if scores[best] <= 0:
+            return None, 0.0
+        return self.emotions[best], float(scores[best])
+
+
 class EmotionCalibrator:
     """Manages personalized emotion calibration for users"""
     
-    def __init__(self, db_path: str = "roomie_data.db"):
+    def __init__(self, db_path: str = "roomie_data.db", pool: Optional[ConnectionPool] = None):
         self.db_path = db_path
+        # Share the conversation memory pool when given one
+        self.pool = pool or ConnectionPool(db_path)
+        # Per-user matrices; generations stop a load that raced a write from being cached
+        self._sets: Dict[int, CalibrationSet] = {}
+        self._generations: Dict[int, int] = {}
+    
+    def _invalidate(self, user_id: int):
+        self._sets.pop(user_id, None)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+    
+    def _record_sample(self, user_id: int, emotion: str, vector: np.ndarray):
+        """Insert a new sample into a cached set instead of reloading it"""
+        calibration = self._sets.get(user_id)
+        self._invalidate(user_id)
+        if calibration is not None and calibration.dim in (0, vector.size):
+            calibration.add(emotion, vector)
+            self._sets[user_id] = calibration
+    
+    async def get_calibration_set(self, user_id: int) -> CalibrationSet:
+        """The user's calibration index, read from the database once and then cached; raises on read errors"""
+        calibration = self._sets.get(user_id)
+        if calibration is None:
+            generation = self._generations.get(user_id, 0)
+            calibration = CalibrationSet(await self._load_calibration(user_id))
+            if self._generations.get(user_id, 0) == generation:
+                self._sets[user_id] = calibration
+        return calibration
+    
+    async def _represent(self, frame: np.ndarray) -> Optional[List[float]]:
+        """Facenet embedding from the shared inference worker, awaited off the event loop"""
+        result = await asyncio.wrap_future(inference_worker.submit(frame, embed=True))
+        return result['embedding']
     
     async def save_calibration_sample(self, user_id: int, emotion: str, frame_data: bytes) -> bool:
         """Save a calibration sample for a user"""
@@ -25,30 +126,28 @@ class EmotionCalibrator:
             # Decode frame
             nparr = np.frombuffer(frame_data, np.uint8)
             frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if frame is None:
+                logger.warning("Calibration sample is not a decodable image")
+                return False
             
-            # Extract facial embedding using DeepFace
-            embedding = DeepFace.represent(
-                frame,
-                model_name='Facenet',
-                enforce_detection=False,
-                detector_backend=Config.EMOTION_DETECTOR_BACKEND
-            )
+            # Extract facial embedding off the event loop
+            embedding_vector = await self._represent(frame)
             
-            if not embedding:
+            if not embedding_vector:
                 logger.warning("No face detected in calibration sample")
                 return False
             
-            # Get the embedding vector
-            embedding_vector = embedding[0]['embedding']
-            embedding_json = json.dumps(embedding_vector)
+            vector = np.asarray(embedding_vector, dtype=EMBEDDING_DTYPE)
             
-            # Save to database
-            async with aiosqlite.connect(self.db_path) as db:
+            # Save to database as raw float32, tagged with the model that produced it
+            async with self.pool.acquire() as db:
                 await db.execute(
-                    "INSERT INTO emotion_calibration (user_id, emotion, embedding) VALUES (?, ?, ?)",
-                    (user_id, emotion, embedding_json)
+                    "INSERT INTO emotion_calibration (user_id, emotion, embedding, dim, model_name) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user_id, emotion, vector.tobytes(), vector.size, EMBEDDING_MODEL)
                 )
                 await db.commit()
+            self._record_sample(user_id, emotion, vector)
             
             logger.info(f"Saved calibration sample for user {user_id}, emotion: {emotion}")
             return True
@@ -57,41 +156,40 @@ class EmotionCalibrator:
             logger.error(f"Error saving calibration sample: {e}")
             return False
     
-    async def get_user_calibration(self, user_id: int) -> Dict[str, List[List[float]]]:
+    async def get_user_calibration(self, user_id: int) -> Dict[str, List[np.ndarray]]:
         """Get all calibration data for a user"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute(
-                    "SELECT emotion, embedding FROM emotion_calibration WHERE user_id = ?",
-                    (user_id,)
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    
-                    calibration_data = {}
-                    for row in rows:
-                        emotion = row['emotion']
-                        embedding = json.loads(row['embedding'])
-                        
-                        if emotion not in calibration_data:
-                            calibration_data[emotion] = []
-                        calibration_data[emotion].append(embedding)
-                    
-                    return calibration_data
+            return await self._load_calibration(user_id)
         except Exception as e:
             logger.error(f"Error getting calibration data: {e}")
             return {}
     
+    async def _load_calibration(self, user_id: int) -> Dict[str, List[np.ndarray]]:
+        # Samples from another embedding model aren't comparable, so they're left out
+        async with self.pool.acquire() as db:
+            async with db.execute(
+                "SELECT emotion, embedding, dim FROM emotion_calibration "
+                "WHERE user_id = ? AND model_name = ?",
+                (user_id, EMBEDDING_MODEL)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        
+        calibration_data = {}
+        dim = None
+        for row in rows:
+            dim = dim or row['dim']
+            if row['dim'] != dim:
+                logger.warning(f"Skipping {row['dim']}-d calibration sample for user {user_id} (expected {dim})")
+                continue
+            # Read-only view over the BLOB; CalibrationSet copies into its index once
+            vector = np.frombuffer(row['embedding'], dtype=EMBEDDING_DTYPE)
+            calibration_data.setdefault(row['emotion'], []).append(vector)
+        return calibration_data
+    
     async def has_calibration(self, user_id: int) -> bool:
         """Check if user has calibration data"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                async with db.execute(
-                    "SELECT COUNT(*) FROM emotion_calibration WHERE user_id = ?",
-                    (user_id,)
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    return row[0] > 0
+            return bool(await self.get_calibration_set(user_id))
         except Exception as e:
             logger.error(f"Error checking calibration: {e}")
             return False
@@ -99,12 +197,13 @@ class EmotionCalibrator:
     async def clear_calibration(self, user_id: int):
         """Clear all calibration data for a user"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.acquire() as db:
                 await db.execute(
                     "DELETE FROM emotion_calibration WHERE user_id = ?",
                     (user_id,)
                 )
                 await db.commit()
+            self._invalidate(user_id)
             logger.info(f"Cleared calibration for user {user_id}")
         except Exception as e:
             logger.error(f"Error clearing calibration: {e}")
@@ -118,43 +217,22 @@ class EmotionCalibrator:
     async def match_emotion(self, user_id: int, frame: np.ndarray) -> Tuple[Optional[str], float]:
         """Match current frame against user's calibrated emotions"""
         try:
-            # Get user's calibration data
-            calibration_data = await self.get_user_calibration(user_id)
-            
-            if not calibration_data:
+            current_vector = await self._represent(frame)
+            if not current_vector:
                 return None, 0.0
+            return await self.match_embedding(user_id, current_vector)
+        except Exception as e:
+            logger.error(f"Error matching emotion: {e}")
+            return None, 0.0
+    
+    async def match_embedding(self, user_id: int, current_vector: List[float]) -> Tuple[Optional[str], float]:
+        """Match an already computed Facenet embedding against user's calibrated emotions"""
+        try:
+            calibration = await self.get_calibration_set(user_id)
+            best_match, best_similarity = calibration.match(current_vector)
             
-            # Extract embedding from current frame
-            current_embedding = DeepFace.represent(
-                frame,
-                model_name='Facenet',
-                enforce_detection=False,
-                detector_backend=Config.EMOTION_DETECTOR_BACKEND
-            )
-            
-            if not current_embedding:
-                return None, 0.0
-            
-            current_vector = current_embedding[0]['embedding']
-            
-            # Compare against all calibrated emotions
-            best_match = None
-            best_similarity = 0.0
-            
-            for emotion, embeddings in calibration_data.items():
-                # Calculate average similarity to all samples of this emotion
-                similarities = [
-                    self.cosine_similarity(current_vector, emb)
-                    for emb in embeddings
-                ]
-                avg_similarity = np.mean(similarities)
-                
-                if avg_similarity > best_similarity:
-                    best_similarity = avg_similarity
-                    best_match = emotion
-            
-            # Only return match if similarity is high enough (>0.7)
-            if best_similarity > 0.7:
+            # Only return match if similarity is high enough
+            if best_similarity > MATCH_THRESHOLD:
                 logger.info(f"Matched emotion: {best_match} (similarity: {best_similarity:.2f})")
                 return best_match, best_similarity
             else:
@@ -165,4 +243,4 @@ class EmotionCalibrator:
             return None, 0.0
 
 # Global instance
-calibrator = EmotionCalibrator()
+calibrator = EmotionCalibrator(pool=memory.pool)
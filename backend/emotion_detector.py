@@ -1,139 +1,180 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
 from collections import deque
 import time
 import asyncio
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread, Lock
+from typing import Callable, Dict, Hashable, Optional
 from config import Config
+from async_runner import async_runner
+from frame_source import frame_source
+from inference_worker import inference_worker
+from model_registry import model_registry
+from motion_gate import MotionGate
+from emotion_smoother import EmotionSmoother
+from emotion_events import emotion_events, CAMERA_ROOM
 from logger import setup_logger
 
 logger = setup_logger("emotion_detector")
 
-# Smoothed rolling results
-recent_emotions = deque(maxlen=8)
 CONFIDENCE_THRESHOLD = Config.EMOTION_CONFIDENCE_THRESHOLD
 EMOTION_PRIORITY = ['happy', 'surprise', 'neutral', 'sad', 'angry', 'fear', 'disgust']
 
-# Caching mechanism
-_emotion_cache = {
-    "emotion": "neutral",
-    "confidence": 0.0,
-    "timestamp": 0
-}
-_cache_lock = Lock()
 
-def detect_emotion_sync(user_id=None, bypass_cache=False):
-    """Synchronous emotion detection with caching and optional personalization"""
-    global _emotion_cache
+class EmotionSession:
+    """Smoothing state and cached result for one face stream"""
     
-    # Check cache (unless bypassing)
-    if not bypass_cache:
-        with _cache_lock:
-            now = time.time()
-            if now - _emotion_cache["timestamp"] < Config.EMOTION_CACHE_TTL:
-                logger.debug(f"Using cached emotion: {_emotion_cache['emotion']}")
-                return _emotion_cache["emotion"], _emotion_cache["confidence"]
+    def __init__(self):
+        # Decayed per-emotion probabilities with hysteresis
+        self.smoother = EmotionSmoother()
+        # Caching mechanism
+        self.cache = {
+            "emotion": "neutral",
+            "confidence": 0.0,
+            "timestamp": 0
+        }
+        self.lock = Lock()
+        # Skips inference while the scene is unchanged or empty
+        self.gate = MotionGate()
+        self.busy = False  # a frame is being analyzed
+        self.frames_dropped = 0
+        self.last_frame = 0.0
     
-    # Capture frame
-    cap = cv2.VideoCapture(0)
-    ret, frame = cap.read()
-    cap.release()
+    def cached(self, max_age=None):
+        """Cached (emotion, confidence), or None when older than max_age"""
+        with self.lock:
+            if max_age is not None and time.time() - self.cache["timestamp"] >= max_age:
+                return None
+            return self.cache["emotion"], self.cache["confidence"]
+    
+    def set_cached(self, emotion, confidence):
+        with self.lock:
+            self.cache = {
+                "emotion": emotion,
+                "confidence": confidence,
+                "timestamp": time.time()
+            }
+    
+    def touch(self):
+        """Keep the cached result fresh without changing it"""
+        with self.lock:
+            self.cache["timestamp"] = time.time()
+    
+    def smooth(self, probabilities):
+        """Add a frame's emotion probabilities and return the smoothed (emotion, confidence)"""
+        with self.lock:
+            stable_emotion, avg_confidence = self.smoother.update(probabilities)
+            smoothed = self.smoother.probabilities()
+            neutral_confidence = self.smoother.confidence('neutral')
+            happy_confidence = self.smoother.confidence('happy')
+        
+        # Bias correction: If settling on fear/sad with low-medium confidence, check if neutral is close
+        if stable_emotion in ['fear', 'sad'] and avg_confidence < 0.80:
+            # Compared on the smoothed probabilities, which share one scale like a single frame's scores
+            stable_score = smoothed.get(stable_emotion, 0.0)
+            neutral_score = smoothed.get('neutral', 0.0)
+            happy_score = smoothed.get('happy', 0.0)
+            
+            # If neutral or happy is within 15% of fear/sad, prefer neutral/happy
+            if neutral_score > (stable_score - 0.15):
+                logger.info(f"Bias correction: Switched from {stable_emotion} to neutral (neutral score: {neutral_score:.2f})")
+                stable_emotion, avg_confidence = 'neutral', neutral_confidence
+            elif happy_score > (stable_score - 0.15):
+                logger.info(f"Bias correction: Switched from {stable_emotion} to happy (happy score: {happy_score:.2f})")
+                stable_emotion, avg_confidence = 'happy', happy_confidence
+        
+        # If confidence is low, neutralize
+        if avg_confidence < CONFIDENCE_THRESHOLD:
+            stable_emotion = "neutral"
+            logger.debug(f"Low average confidence ({avg_confidence:.2f}), using neutral")
+        
+        return stable_emotion, avg_confidence
+    
+    def reset_smoothing(self):
+        """Forget the smoothed history, e.g. after the camera was released"""
+        with self.lock:
+            self.smoother.reset()
 
-    if not ret:
-        logger.warning("Failed to capture frame from camera")
+
+# The server's own camera, watched by the background monitor
+_local_session = EmotionSession()
+
+# Browser webcam streams, keyed by Socket.IO session id
+_sessions: Dict[Hashable, EmotionSession] = {}
+_sessions_lock = Lock()
+
+# Decodes client frames and waits on the inference worker; its size bounds frames in flight
+_frame_executor = ThreadPoolExecutor(max_workers=Config.CLIENT_FRAME_WORKERS, thread_name_prefix="client-frame")
+
+
+def _analyze_frame(session, frame, user_id=None):
+    """Run detection on one frame and update the session's smoothing state and cache"""
+    if not session.gate.should_infer(frame):
+        # Nothing meaningful changed; the last result still stands
+        session.touch()
+        return session.cached()
+    
+    # Embeddings are only needed for users with personal calibration
+    calibrated = False
+    if user_id:
+        try:
+            from emotion_calibration import calibrator, MATCH_THRESHOLD
+            calibrated = async_runner.run(calibrator.has_calibration(user_id))
+        except Exception as e:
+            logger.error(f"Calibration lookup error: {e}, falling back to default")
+    
+    # One batched pass: face detected once, shared by the emotion and Facenet models
+    try:
+        result = inference_worker.analyze(frame, embed=calibrated, timeout=Config.REQUEST_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Emotion detection error: {e}")
         return "neutral", 0.0
     
     # Try personalized calibration first if user_id provided
-    if user_id:
+    if calibrated and result['embedding']:
         try:
-            from emotion_calibration import calibrator
-            has_calibration = asyncio.run(calibrator.has_calibration(user_id))
+            emotion, confidence = async_runner.run(calibrator.match_embedding(user_id, result['embedding']))
             
-            if has_calibration:
-                emotion, confidence = asyncio.run(calibrator.match_emotion(user_id, frame))
-                
-                if emotion and confidence > 0.7:
-                    logger.info(f"Personalized match: {emotion} (confidence: {confidence:.2f})")
-                    
-                    # Update cache
-                    with _cache_lock:
-                        _emotion_cache = {
-                            "emotion": emotion,
-                            "confidence": confidence,
-                            "timestamp": time.time()
-                        }
-                    
-                    return emotion, confidence
-                else:
-                    logger.debug(f"Personalized match too weak ({confidence:.2f}), falling back to default")
+            if emotion and confidence > MATCH_THRESHOLD:
+                logger.info(f"Personalized match: {emotion} (confidence: {confidence:.2f})")
+                session.set_cached(emotion, confidence)
+                return emotion, confidence
+            else:
+                logger.debug(f"Personalized match too weak ({confidence:.2f}), falling back to default")
         except Exception as e:
             logger.error(f"Calibration matching error: {e}, falling back to default")
     
-    # Fall back to default DeepFace detection
+    # Fall back to default emotion model output, smoothed over time from the full probability vector
     try:
-        # Use faster detector backend (opencv instead of retinaface)
-        result = DeepFace.analyze(
-            frame,
-            actions=['emotion'],
-            enforce_detection=False,
-            detector_backend=Config.EMOTION_DETECTOR_BACKEND,
-            silent=True
-        )
-        
-        emotion = result[0]['dominant_emotion']
-        confidence = float(result[0]['emotion'][emotion]) / 100.0  # Normalize to 0-1
-        all_emotions = result[0]['emotion']
-        
-        # Bias correction: If detecting fear/sad with low-medium confidence, check if neutral is close
-        if emotion in ['fear', 'sad'] and confidence < 0.80:
-            neutral_score = float(all_emotions.get('neutral', 0)) / 100.0
-            happy_score = float(all_emotions.get('happy', 0)) / 100.0
-            
-            # If neutral or happy is within 15% of fear/sad, prefer neutral/happy
-            if neutral_score > (confidence - 0.15):
-                emotion = 'neutral'
-                confidence = neutral_score
-                logger.info(f"Bias correction: Switched from fear/sad to neutral (neutral score: {neutral_score:.2f})")
-            elif happy_score > (confidence - 0.15):
-                emotion = 'happy'
-                confidence = happy_score
-                logger.info(f"Bias correction: Switched from fear/sad to happy (happy score: {happy_score:.2f})")
-        
-        logger.info(f"Detected emotion: {emotion} (confidence: {confidence:.2f})")
-        
+        probabilities = result['emotion']
+        logger.debug(f"Detected emotion: {result['dominant_emotion']} "
+                     f"(confidence: {float(probabilities[result['dominant_emotion']]) / 100.0:.2f})")
+        stable_emotion, avg_confidence = session.smooth(probabilities)
     except Exception as e:
         logger.error(f"Emotion detection error: {e}")
         return "neutral", 0.0
+    
+    session.set_cached(stable_emotion, avg_confidence)
+    return stable_emotion, avg_confidence
 
-    # Add to smoothing queue
-    recent_emotions.append((emotion, confidence))
-
-    # Weighted smoothing: Pick emotion with highest average confidence in recent frames
-    emotion_scores = {}
-    for emo, conf in recent_emotions:
-        if emo not in emotion_scores:
-            emotion_scores[emo] = []
-        emotion_scores[emo].append(conf)
-    
-    # Calculate average confidence for each emotion
-    stable_emotion = max(emotion_scores.items(), key=lambda x: sum(x[1]) / len(x[1]))[0]
-    avg_confidence = sum(emotion_scores[stable_emotion]) / len(emotion_scores[stable_emotion])
-
-    # If confidence is low, neutralize
-    if avg_confidence < CONFIDENCE_THRESHOLD:
-        stable_emotion = "neutral"
-        logger.debug(f"Low average confidence ({avg_confidence:.2f}), using neutral")
-
-    # Update cache
-    with _cache_lock:
-        _emotion_cache = {
-            "emotion": stable_emotion,
-            "confidence": avg_confidence,
-            "timestamp": time.time()
-        }
 
-    return stable_emotion, avg_confidence
+def detect_emotion_sync(user_id=None, bypass_cache=False):
+    """Synchronous emotion detection on the server camera with caching and optional personalization"""
+    # Check cache (unless bypassing)
+    if not bypass_cache:
+        cached = _local_session.cached(max_age=Config.EMOTION_CACHE_TTL)
+        if cached:
+            logger.debug(f"Using cached emotion: {cached[0]}")
+            return cached
+    
+    # Latest frame from the persistent capture thread; the first call waits for the device
+    latest = frame_source.latest(max_age=Config.CAMERA_MAX_FRAME_AGE, timeout=Config.CAMERA_MAX_FRAME_AGE)
+    if latest is None:
+        logger.warning("Failed to capture frame from camera")
+        return "neutral", 0.0
+    
+    return _analyze_frame(_local_session, latest.image, user_id)
 
 
 async def detect_emotion():
@@ -143,47 +184,225 @@ async def detect_emotion():
     return emotion, confidence
 
 
-def get_cached_emotion():
-    """Get current emotion from cache without triggering detection"""
-    with _cache_lock:
-        return _emotion_cache["emotion"], _emotion_cache["confidence"]
+def get_session(session_id):
+    """Emotion state for a client stream, created on first use"""
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            session = _sessions[session_id] = EmotionSession()
+        return session
+
+
+def drop_session(session_id):
+    """Forget a client stream's state when it disconnects"""
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
+
+
+def has_session(session_id):
+    with _sessions_lock:
+        return session_id in _sessions
+
+
+def submit_client_frame(session_id, frame_data: bytes, user_id=None,
+                        on_result: Optional[Callable[[str, float], None]] = None) -> bool:
+    """
+    Queue a compressed frame from a client's webcam for analysis.
+    Returns False when the frame is dropped because the previous one is still in flight.
+    """
+    session = get_session(session_id)
+    with session.lock:
+        if session.busy:
+            session.frames_dropped += 1
+            return False
+        session.busy = True
+        session.last_frame = time.time()
+    
+    def run():
+        try:
+            frame = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                logger.warning(f"Undecodable frame from session {session_id}")
+                return
+            emotion, confidence = _analyze_frame(session, frame, user_id)
+            if on_result:
+                on_result(emotion, confidence)
+        except Exception as e:
+            logger.error(f"Client frame error: {e}")
+        finally:
+            with session.lock:
+                session.busy = False
+    
+    _frame_executor.submit(run)
+    return True
+
+
+def get_cached_emotion(session_id=None):
+    """
+    Get current emotion from cache without triggering detection.
+    Uses the client's own stream when it has one, else the server camera.
+    """
+    if session_id is not None:
+        with _sessions_lock:
+            session = _sessions.get(session_id)
+        if session is not None:
+            return session.cached()
+    return _local_session.cached()
+
+
+def session_stats():
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    return {
+        "client_sessions": len(sessions),
+        "frames_in_flight": sum(1 for s in sessions if s.busy),
+        "frames_dropped": sum(s.frames_dropped for s in sessions),
+        "inferences_skipped": sum(s.gate.skipped_static + s.gate.skipped_no_face for s in sessions),
+        "emotion_switches": sum(s.smoother.switches for s in sessions),
+        "camera_gate": _local_session.gate.stats()
+    }
 
 
 class BackgroundEmotionMonitor:
-    """Background thread for continuous emotion monitoring"""
+    """
+    Background thread for continuous emotion monitoring.
+    Runs only while at least one client is connected, and backs off while the
+    detected emotion stays the same. Results are published to the camera room.
+    """
     
-    def __init__(self, interval=5.0, user_id=None):
+    def __init__(self, interval=Config.EMOTION_MONITOR_INTERVAL,
+                 max_interval=Config.EMOTION_MONITOR_MAX_INTERVAL, user_id=None):
+        self.min_interval = interval
+        self.max_interval = max(interval, max_interval)
         self.interval = interval
         self.user_id = user_id
         self.running = False
         self.thread = None
+        self._clients = set()
+        self._cond = Condition()
+        self.detections = 0
+        self.errors = 0
+        self.last_emotion = None
+        self.last_detection = 0.0
+        self.last_inference_ms = 0.0
+    
+    def _next_interval(self, emotion, inference_seconds):
+        """Back off while the emotion is stable, snap back when it changes"""
+        if emotion == self.last_emotion:
+            interval = min(self.max_interval, self.interval * 1.5)
+        else:
+            interval = self.min_interval
+        # Keep inference from using more than about half of the loop
+        return max(interval, inference_seconds * 2)
+    
+    def _wait(self, seconds):
+        """Sleep until the next detection, returning early on stop; caller holds the lock"""
+        deadline = time.monotonic() + seconds
+        while self.running and self._clients:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self._cond.wait(remaining)
     
     def _monitor_loop(self):
         """Main monitoring loop"""
-        while self.running:
+        while True:
+            with self._cond:
+                idle = self.running and not self._clients
+            if idle:
+                logger.info("No clients connected, emotion monitoring paused")
+                # Nothing to watch for; let the camera go too
+                frame_source.stop()
+                # The next frame comes from a reopened camera, not the scene the gate last saw
+                _local_session.gate.reset()
+                # Whoever shows up next starts from their own expression, not the last client's
+                _local_session.reset_smoothing()
+                with self._cond:
+                    while self.running and not self._clients:
+                        self._cond.wait()
+                if self.running:
+                    logger.info("Emotion monitoring resumed")
+                    self.interval = self.min_interval
+            if not self.running:
+                break
+            
+            started = time.monotonic()
             try:
                 # Detect emotion with user_id for personalization
-                detect_emotion_sync(user_id=self.user_id, bypass_cache=True)
-                time.sleep(self.interval)
+                emotion, confidence = detect_emotion_sync(user_id=self.user_id, bypass_cache=True)
+                elapsed = time.monotonic() - started
+                emotion_events.publish(CAMERA_ROOM, emotion, confidence)
+                self.interval = self._next_interval(emotion, elapsed)
+                self.last_emotion = emotion
+                self.last_detection = time.time()
+                self.last_inference_ms = elapsed * 1000
+                self.detections += 1
             except Exception as e:
                 logger.error(f"Background monitoring error: {e}")
-                time.sleep(self.interval)
+                self.errors += 1
+                self.interval = self.min_interval
+            
+            with self._cond:
+                self._wait(self.interval)
+        
+        frame_source.stop()
+        _local_session.gate.reset()
+        _local_session.reset_smoothing()
     
     def start(self):
-        """Start background monitoring"""
-        if not self.running:
+        """Start background monitoring; detection waits for the first client"""
+        with self._cond:
+            if self.running:
+                return
             self.running = True
-            self.thread = Thread(target=self._monitor_loop, daemon=True)
+            self.thread = Thread(target=self._monitor_loop, name="emotion-monitor", daemon=True)
             self.thread.start()
-            logger.info("Background emotion monitoring started")
+        logger.info("Background emotion monitoring started")
     
     def stop(self):
         """Stop background monitoring"""
-        self.running = False
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
         if self.thread:
             self.thread.join(timeout=2)
         logger.info("Background emotion monitoring stopped")
+    
+    def acquire(self, client_id):
+        """Register a connected client; the first one resumes detection"""
+        with self._cond:
+            self._clients.add(client_id)
+            self._cond.notify_all()
+        self.start()
+    
+    def release(self, client_id):
+        """Unregister a client; detection pauses when none are left"""
+        with self._cond:
+            self._clients.discard(client_id)
+            self._cond.notify_all()
+    
+    def is_alive(self):
+        return self.running and self.thread is not None and self.thread.is_alive()
+    
+    def health(self):
+        """Monitor state for the health endpoint"""
+        with self._cond:
+            clients = len(self._clients)
+        return {
+            "alive": self.is_alive(),
+            "clients": clients,
+            "paused": clients == 0,
+            "interval": self.interval,
+            "detections": self.detections,
+            "errors": self.errors,
+            "last_emotion": self.last_emotion,
+            "last_detection_age": time.time() - self.last_detection if self.last_detection else None,
+            "last_inference_ms": self.last_inference_ms
+        }
+
 
+# Global instance shared by the HTTP and Socket.IO handlers
+emotion_monitor = BackgroundEmotionMonitor()
 
 
 def live_emotion_detector():
@@ -194,6 +413,8 @@ def live_emotion_detector():
         return
 
     print("🎥 Live Emotion Detection started. Press 'q' to quit.")
+    DeepFace = model_registry.get("deepface")
+    recent = deque(maxlen=8)
     while True:
         ret, frame = cap.read()
         if not ret:
@@ -210,8 +431,8 @@ def live_emotion_detector():
             emotion = result[0]['dominant_emotion']
             confidence = result[0]['emotion'][emotion]
 
-            recent_emotions.append(emotion)
-            stable_emotion = max(set(recent_emotions), key=recent_emotions.count)
+            recent.append(emotion)
+            stable_emotion = max(set(recent), key=recent.count)
 
             if confidence < CONFIDENCE_THRESHOLD * 100:
                 stable_emotion = "neutral"
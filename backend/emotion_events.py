@@ -0,0 +1,124 @@
+"""
+Emotion change events for ROOMie
+Detections are published per room; subscribers only hear about a room when
+its emotion or confidence bucket changes, at most once per debounce window
+"""
+import time
+from threading import Lock, Timer
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger("emotion_events")
+
+# Clients watching the server camera rather than pushing their own frames
+CAMERA_ROOM = "camera"
+
+
+def user_room(user_id) -> str:
+    """Room shared by every connection of a logged-in user"""
+    return f"user_{user_id}"
+
+
+class _RoomState:
+    __slots__ = ("sent", "sent_at", "pending", "timer")
+
+    def __init__(self):
+        self.sent: Optional[Tuple[str, int]] = None  # (emotion, confidence bucket) last delivered
+        self.sent_at = 0.0
+        self.pending: Optional[Dict] = None  # newest change held back by the debounce
+        self.timer: Optional[Timer] = None
+
+
+class EmotionPublisher:
+    """
+    Debounced emotion change fan-out.
+    The first change in a room goes out at once; changes arriving within
+    `debounce` seconds of the last delivery are coalesced and the newest is
+    sent when the window closes, so the final state is never lost.
+    """
+
+    def __init__(self, bucket_size: float = Config.EMOTION_PUSH_BUCKET,
+                 debounce: float = Config.EMOTION_PUSH_DEBOUNCE):
+        self.bucket_size = bucket_size
+        self.debounce = debounce
+        self._rooms: Dict[Hashable, _RoomState] = {}
+        self._listeners: List[Callable[[Hashable, Dict], None]] = []
+        self._lock = Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, listener: Callable[[Hashable, Dict], None]):
+        """listener(room, payload) is called for every delivered change"""
+        self._listeners.append(listener)
+
+    def _bucket(self, confidence: float) -> int:
+        # The epsilon keeps 0.7 / 0.1 in bucket 7 despite float rounding
+        return int(confidence / self.bucket_size + 1e-9) if self.bucket_size > 0 else 0
+
+    def publish(self, room: Hashable, emotion: str, confidence: float):
+        """Report a detection; delivered only if it changes what the room last heard"""
+        payload = {
+            'emotion': emotion,
+            'confidence': float(confidence),
+            'timestamp': time.time()
+        }
+        with self._lock:
+            self.published += 1
+            state = self._rooms.setdefault(room, _RoomState())
+            if (emotion, self._bucket(confidence)) == state.sent:
+                state.pending = None  # back to what the room already shows
+                return
+            wait = state.sent_at + self.debounce - time.monotonic()
+            if wait > 0:
+                state.pending = payload
+                if state.timer is None:
+                    state.timer = Timer(wait, self._flush, args=(room,))
+                    state.timer.daemon = True
+                    state.timer.start()
+                return
+            self._mark_sent(state, payload)
+        self._deliver(room, payload)
+
+    def _mark_sent(self, state: _RoomState, payload: Dict):
+        state.sent = (payload['emotion'], self._bucket(payload['confidence']))
+        state.sent_at = time.monotonic()
+
+    def _flush(self, room: Hashable):
+        with self._lock:
+            state = self._rooms.get(room)
+            if state is None:
+                return
+            state.timer = None
+            payload, state.pending = state.pending, None
+            if payload is None:
+                return
+            self._mark_sent(state, payload)
+        self._deliver(room, payload)
+
+    def _deliver(self, room: Hashable, payload: Dict):
+        self.delivered += 1
+        for listener in self._listeners:
+            try:
+                listener(room, payload)
+            except Exception as e:
+                logger.error(f"Emotion event listener error: {e}")
+
+    def forget(self, room: Hashable):
+        """Drop a room's state, e.g. when its last client leaves"""
+        with self._lock:
+            state = self._rooms.pop(room, None)
+            if state is not None and state.timer is not None:
+                state.timer.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "published": self.published,
+                "delivered": self.delivered
+            }
+
+
+# Global instance
+emotion_events = EmotionPublisher()
@@ -0,0 +1,105 @@
+"""
+Temporal emotion smoothing for ROOMie
+Folds each frame's full probability vector into exponentially decayed
+per-emotion scores, and only changes the reported emotion when another one
+leads by a clear margin
+"""
+import time
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from config import Config
+from inference_worker import EMOTION_LABELS
+
+
+class EmotionSmoother:
+    """
+    Streaming emotion state for one face stream.
+    Scores decay with a half-life in seconds rather than per frame, so slow or
+    irregular frame rates smooth over the same span of time. The state only
+    moves to a new emotion once its decayed probability beats the current
+    one's by at least `hysteresis`. The reported confidence is the decayed
+    mean probability over the frames where that emotion led, the same scale
+    as a single frame's dominant score.
+    """
+
+    def __init__(self, half_life: float = Config.EMOTION_SMOOTHING_HALF_LIFE,
+                 hysteresis: float = Config.EMOTION_HYSTERESIS,
+                 labels: Sequence[str] = EMOTION_LABELS):
+        self.half_life = half_life
+        self.hysteresis = hysteresis
+        self.labels = list(labels)
+        self._index = {label: i for i, label in enumerate(self.labels)}
+        self._scores = np.zeros(len(self.labels))
+        self._weight = 0.0  # decayed number of frames, to turn scores into a mean
+        # Decayed sum and count of each emotion's probability over the frames it led
+        self._lead_scores = np.zeros(len(self.labels))
+        self._lead_weights = np.zeros(len(self.labels))
+        self._last_update: Optional[float] = None
+        self._state: Optional[int] = None
+        self.switches = 0
+
+    def update(self, probabilities: Dict[str, float], timestamp: Optional[float] = None) -> Tuple[str, float]:
+        """Add one frame's probabilities (any scale) and return (emotion, confidence)"""
+        now = time.monotonic() if timestamp is None else timestamp
+        frame = np.zeros(len(self.labels))
+        for label, score in probabilities.items():
+            i = self._index.get(label)
+            if i is not None:
+                frame[i] = score
+        total = frame.sum()
+        if total <= 0:
+            return self.current()
+        frame /= total
+
+        if self._last_update is None or self.half_life <= 0:
+            decay = 0.0  # first frame, or smoothing turned off
+        else:
+            decay = 0.5 ** (max(0.0, now - self._last_update) / self.half_life)
+        self._scores = self._scores * decay + frame
+        self._weight = self._weight * decay + 1.0
+        self._lead_scores *= decay
+        self._lead_weights *= decay
+        winner = int(np.argmax(frame))
+        self._lead_scores[winner] += frame[winner]
+        self._lead_weights[winner] += 1.0
+        self._last_update = now
+
+        mean = self._scores / self._weight
+        leader = int(np.argmax(mean))
+        if self._state is None:
+            self._state = leader
+        elif leader != self._state and mean[leader] - mean[self._state] >= self.hysteresis:
+            self._state = leader
+            self.switches += 1
+        return self.labels[self._state], self._confidence(self._state)
+
+    def _confidence(self, i: int) -> float:
+        if self._lead_weights[i] > 0:
+            return float(self._lead_scores[i] / self._lead_weights[i])
+        return float(self._scores[i] / self._weight) if self._weight else 0.0
+
+    def confidence(self, label: str) -> float:
+        """Mean probability of an emotion over the frames it led, else its smoothed probability"""
+        i = self._index.get(label)
+        return self._confidence(i) if i is not None else 0.0
+
+    def current(self) -> Tuple[str, float]:
+        """Current (emotion, confidence) without adding a frame"""
+        if self._state is None:
+            return "neutral", 0.0
+        return self.labels[self._state], self._confidence(self._state)
+
+    def probabilities(self) -> Dict[str, float]:
+        """Smoothed probability per emotion"""
+        if not self._weight:
+            return {label: 0.0 for label in self.labels}
+        return {label: float(score) for label, score in zip(self.labels, self._scores / self._weight)}
+
+    def reset(self):
+        """Drop the history; switch counts are kept"""
+        self._scores[:] = 0
+        self._weight = 0.0
+        self._lead_scores[:] = 0
+        self._lead_weights[:] = 0
+        self._last_update = None
+        self._state = None
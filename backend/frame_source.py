@@ -0,0 +1,204 @@
+"""
+Persistent frame capture for ROOMie
+Keeps the camera (or a video file / image directory) open on a background
+thread and always holds the latest frame, so detection never pays for
+opening the device
+"""
+import os
+import time
+from pathlib import Path
+from threading import Condition, Thread
+from typing import List, NamedTuple, Optional, Tuple, Union
+import cv2
+import numpy as np
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger("frame_source")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+class Frame(NamedTuple):
+    image: np.ndarray  # BGR, shared between consumers; do not modify in place
+    seq: int  # increases by one per captured frame
+    timestamp: float  # time.monotonic() at capture
+
+
+class CaptureReader:
+    """cv2.VideoCapture over a camera index, video file or stream URL"""
+
+    def __init__(self, target: Union[int, str], loop: bool = False):
+        self.target = target
+        self.loop = loop  # rewind video files instead of ending
+        self.cap = cv2.VideoCapture(target)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open capture source {target!r}")
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectoryReader:
+    """Cycles through the images in a directory, in name order"""
+
+    def __init__(self, directory: str):
+        self.paths: List[Path] = sorted(
+            p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS
+        )
+        if not self.paths:
+            raise IOError(f"No images found in {directory}")
+        self.index = 0
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        path = self.paths[self.index]
+        self.index = (self.index + 1) % len(self.paths)
+        frame = cv2.imread(str(path))
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def open_reader(source: str):
+    """Pick a reader for a CAMERA_SOURCE value: camera index, image directory or video path/URL"""
+    source = str(source).strip()
+    if source.isdigit():
+        return CaptureReader(int(source))
+    if os.path.isdir(source):
+        return ImageDirectoryReader(source)
+    return CaptureReader(source, loop=True)
+
+
+class FrameSource:
+    """
+    Background grabber with a single-slot latest-frame buffer.
+    Each captured frame is a new array, so consumers get it without a copy.
+    """
+
+    def __init__(self, source: str, fps: float = 0.0, reopen_delay: float = 1.0):
+        self.source = source
+        # Pace file and directory sources; cameras block on their own frame rate
+        self.frame_interval = 1.0 / fps if fps > 0 and not str(source).strip().isdigit() else 0.0
+        self.reopen_delay = reopen_delay
+        self._latest: Optional[Frame] = None
+        self._seq = 0
+        self._cond = Condition()
+        self._running = False
+        self._thread: Optional[Thread] = None
+        self.frames_captured = 0
+        self.read_failures = 0
+
+    def start(self):
+        """Open the source and start grabbing"""
+        with self._cond:
+            if self._running:
+                return
+            if self._thread is not None and self._thread.is_alive():
+                # The last capture thread is still inside a read; two would share the device
+                logger.warning("Frame source is still stopping, not restarting yet")
+                return
+            self._running = True
+            self._thread = Thread(target=self._capture_loop, name="frame-source", daemon=True)
+            self._thread.start()
+        logger.info(f"Frame source started ({self.source})")
+
+    def stop(self):
+        """Stop grabbing and release the device"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=2)
+            if thread.is_alive():
+                # Keep the handle so start() waits for this thread to let go of the device
+                logger.warning("Frame source thread did not exit within 2 s")
+                return
+        with self._cond:
+            if self._thread is thread:
+                self._thread = None
+        logger.info("Frame source stopped")
+
+    def is_running(self) -> bool:
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def _capture_loop(self):
+        reader = None
+        while self._running:
+            if reader is None:
+                try:
+                    reader = open_reader(self.source)
+                except Exception as e:
+                    logger.error(f"Frame source open error: {e}")
+                    time.sleep(self.reopen_delay)
+                    continue
+
+            started = time.monotonic()
+            try:
+                ret, image = reader.read()
+            except Exception as e:
+                logger.error(f"Frame read error: {e}")
+                ret, image = False, None
+
+            if not ret:
+                # Device unplugged or busy: reopen it after a pause
+                self.read_failures += 1
+                logger.warning("Failed to capture frame, reopening source")
+                reader.release()
+                reader = None
+                time.sleep(self.reopen_delay)
+                continue
+
+            with self._cond:
+                self._seq += 1
+                self._latest = Frame(image, self._seq, time.monotonic())
+                self.frames_captured += 1
+                self._cond.notify_all()
+
+            if self.frame_interval:
+                time.sleep(max(0.0, self.frame_interval - (time.monotonic() - started)))
+
+        if reader is not None:
+            reader.release()
+
+    def latest(self, max_age: Optional[float] = None, timeout: float = 0.0) -> Optional[Frame]:
+        """
+        Return the most recent frame, starting the grabber if needed.
+        Waits up to timeout for a first (or fresh enough) frame.
+        """
+        if not self._running:
+            self.start()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                frame = self._latest
+                if frame is not None and (max_age is None or time.monotonic() - frame.timestamp <= max_age):
+                    return frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return None
+                self._cond.wait(remaining)
+
+    def stats(self) -> dict:
+        frame = self._latest
+        return {
+            "source": str(self.source),
+            "running": self.is_running(),
+            "frames_captured": self.frames_captured,
+            "read_failures": self.read_failures,
+            "frame_age": time.monotonic() - frame.timestamp if frame else None
+        }
+
+
+# Global instance
+frame_source = FrameSource(Config.CAMERA_SOURCE, fps=Config.CAMERA_FPS)
@@ -0,0 +1,615 @@
+"""
+Batched face inference for ROOMie
+Collects frames from every caller into micro-batches, detects each face once
+and runs the emotion and Facenet models once per batch.
+In process mode the models live in separate worker processes, fed through
+shared memory, so TensorFlow never competes with request handling for the GIL.
+"""
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import Future
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple, Union
+import cv2
+import numpy as np
+from config import Config
+from logger import setup_logger
+from model_registry import model_registry
+
+logger = setup_logger("inference_worker")
+
+# Output order of DeepFace's emotion model
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+EMOTION_INPUT_SIZE = (224, 224)  # DeepFace resizes to this before the 48x48 grayscale step
+EMOTION_MODEL_SIZE = (48, 48)
+EMBEDDING_MODEL = 'Facenet'
+# Raised by a DeepFace release whose internals differ from what batching expects,
+# as opposed to a frame it simply can't process
+INCOMPATIBLE_API_ERRORS = (AttributeError, KeyError, TypeError)
+
+# Largest frame copied to a worker process as is; bigger ones are downscaled first
+MAX_SHARED_FRAME = (720, 1280)
+AUTHKEY_ENV = "ROOMIE_INFERENCE_AUTHKEY"
+
+
+def _deepface():
+    """DeepFace (and TensorFlow with it), imported on first use"""
+    return model_registry.get("deepface")
+
+
+def _build_model(model_name: str, task: str):
+    """DeepFace.build_model across releases; newer ones take a task argument"""
+    try:
+        return _deepface().build_model(model_name=model_name, task=task)
+    except TypeError:
+        return _deepface().build_model(model_name)
+
+
+def _letterbox(img: np.ndarray, size) -> np.ndarray:
+    """Scale to fit and zero-pad to size, as DeepFace's resize_image does"""
+    target_h, target_w = size
+    factor = min(target_h / img.shape[0], target_w / img.shape[1])
+    resized = cv2.resize(img, (max(1, int(img.shape[1] * factor)), max(1, int(img.shape[0] * factor))))
+    pad_h = target_h - resized.shape[0]
+    pad_w = target_w - resized.shape[1]
+    padding = [(pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2)]
+    padding += [(0, 0)] * (resized.ndim - 2)
+    padded = np.pad(resized, padding, "constant")
+    if padded.shape[:2] != (target_h, target_w):
+        padded = cv2.resize(padded, (target_w, target_h))
+    return padded
+
+
+class FaceModels:
+    """DeepFace emotion and Facenet models driven in batches"""
+
+    def __init__(self):
+        self._emotion_model = None
+        self._embedding_model = None
+        self._embedding_size = (160, 160)
+        self._load_lock = Lock()  # warm-up and the first batch may race
+        self.batched = True  # cleared if the models can't be driven directly
+
+    def load(self, embedding: bool = True):
+        """Load models up front instead of on the first batch"""
+        self._load_emotion_model()
+        if embedding:
+            self._load_embedding_model()
+
+    def _load_emotion_model(self):
+        with self._load_lock:
+            if self._emotion_model is None:
+                client = _build_model('Emotion', 'facial_attribute')
+                # Newer releases wrap the Keras model in a client object
+                self._emotion_model = getattr(client, 'model', client)
+                logger.info("Emotion model loaded")
+
+    def _load_embedding_model(self):
+        with self._load_lock:
+            if self._embedding_model is None:
+                client = _build_model(EMBEDDING_MODEL, 'facial_recognition')
+                self._embedding_model = getattr(client, 'model', client)
+                shape = getattr(client, 'input_shape', None)
+                if shape:
+                    # (h, w) on clients, (None, h, w, 3) on bare Keras models
+                    self._embedding_size = tuple(shape[1:3]) if len(shape) == 4 else tuple(shape[:2])
+                logger.info(f"{EMBEDDING_MODEL} model loaded")
+
+    def infer(self, items: List[Tuple[np.ndarray, bool]]) -> List[Union[Dict, Exception]]:
+        """Results for (frame, want_embedding) pairs, in order; a failed item gets its exception"""
+        if self.batched:
+            # A model that can't be loaded fails the batch but says nothing about the API
+            self._load_emotion_model()
+            if any(embed for _, embed in items):
+                self._load_embedding_model()
+            try:
+                return self._infer_batched(items)
+            except Exception as e:
+                # An unexpected DeepFace release; the public API still works per frame
+                logger.warning(f"Batched inference unavailable ({e}), using per-frame DeepFace calls")
+                self.batched = False
+        return [self._infer_single_safe(frame, embed) for frame, embed in items]
+
+    def _extract_face(self, frame: np.ndarray) -> np.ndarray:
+        """Detect and align the first face once; BGR float in [0, 1]"""
+        faces = _deepface().extract_faces(
+            frame,
+            detector_backend=Config.EMOTION_DETECTOR_BACKEND,
+            enforce_detection=False,
+            align=True
+        )
+        face = np.asarray(faces[0]['face'], dtype=np.float32)
+        if face.max() > 1:
+            face = face / 255.0
+        return np.ascontiguousarray(face[:, :, ::-1])  # DeepFace hands out RGB
+
+    def _infer_batched(self, items: List[Tuple[np.ndarray, bool]]) -> List[Union[Dict, Exception]]:
+        """One model pass per batch; raises only if the models can't be driven directly"""
+        results: List[Union[Dict, Exception]] = []
+        for frame, _ in items:
+            # Per item, so one bad frame doesn't fail the rest of the batch
+            try:
+                results.append(self._extract_face(frame))
+            except INCOMPATIBLE_API_ERRORS:
+                raise
+            except Exception as e:
+                results.append(e)
+        ok = [i for i, result in enumerate(results) if not isinstance(result, Exception)]
+        if not ok:
+            return results
+        faces = [results[i] for i in ok]
+
+        # One emotion forward pass for the whole batch
+        gray = np.stack([
+            cv2.resize(cv2.cvtColor(_letterbox(face, EMOTION_INPUT_SIZE), cv2.COLOR_BGR2GRAY), EMOTION_MODEL_SIZE)
+            for face in faces
+        ])[..., np.newaxis]
+        scores = np.asarray(self._emotion_model(gray, training=False))
+        scores = 100 * scores / scores.sum(axis=1, keepdims=True)
+
+        embeddings: List[Optional[List[float]]] = [None] * len(ok)
+        wanted = [j for j, i in enumerate(ok) if items[i][1]]
+        if wanted:
+            # Same crops, one Facenet forward pass
+            crops = np.stack([_letterbox(faces[j], self._embedding_size) for j in wanted])
+            vectors = np.asarray(self._embedding_model(crops, training=False))
+            for j, vector in zip(wanted, vectors):
+                embeddings[j] = vector.tolist()
+
+        for i, row, embedding in zip(ok, scores, embeddings):
+            results[i] = {
+                'dominant_emotion': EMOTION_LABELS[int(np.argmax(row))],
+                'emotion': {label: float(score) for label, score in zip(EMOTION_LABELS, row)},
+                'embedding': embedding
+            }
+        return results
+
+    def _infer_single_safe(self, frame: np.ndarray, embed: bool) -> Union[Dict, Exception]:
+        try:
+            return self._infer_single(frame, embed)
+        except Exception as e:
+            return e
+
+    def _infer_single(self, frame: np.ndarray, embed: bool) -> Dict:
+        analysis = _deepface().analyze(
+            frame,
+            actions=['emotion'],
+            enforce_detection=False,
+            detector_backend=Config.EMOTION_DETECTOR_BACKEND,
+            silent=True
+        )[0]
+        embedding = None
+        if embed:
+            represented = _deepface().represent(
+                frame,
+                model_name=EMBEDDING_MODEL,
+                enforce_detection=False,
+                detector_backend=Config.EMOTION_DETECTOR_BACKEND
+            )
+            embedding = represented[0]['embedding'] if represented else None
+        return {
+            'dominant_emotion': analysis['dominant_emotion'],
+            'emotion': {label: float(score) for label, score in analysis['emotion'].items()},
+            'embedding': embedding
+        }
+
+
+class _Request:
+    __slots__ = ("frame", "embed", "future")
+
+    def __init__(self, frame: np.ndarray, embed: bool):
+        self.frame = frame
+        self.embed = embed
+        self.future: Future = Future()
+
+
+class InferenceWorker:
+    """
+    Single inference thread fed by a queue.
+    Results are dicts with 'dominant_emotion', 'emotion' (percentages, like
+    DeepFace.analyze) and 'embedding' (Facenet vector or None).
+    """
+
+    def __init__(self, max_batch: int = Config.INFERENCE_BATCH_SIZE,
+                 max_wait: float = Config.INFERENCE_BATCH_WAIT_MS / 1000):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+        self.models = FaceModels()
+        self.batches = 0
+        self.frames = 0
+        self.last_batch_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = Thread(target=self._run, name="inference-worker", daemon=True)
+            self._thread.start()
+        logger.info(f"Inference worker started (batch {self.max_batch}, wait {self.max_wait * 1000:.0f} ms)")
+
+    def stop(self):
+        """The in-process worker holds nothing that needs releasing"""
+
+    def warm_up(self):
+        """Start the worker and load its models now rather than on the first frame"""
+        self.start()
+        self.models.load()
+        return self
+
+    def submit(self, frame: np.ndarray, embed: bool = False) -> Future:
+        """Queue a BGR frame; the future resolves to the result dict"""
+        if not isinstance(frame, np.ndarray) or frame.ndim not in (2, 3) or frame.size == 0:
+            # e.g. cv2.imdecode's None for an undecodable upload
+            raise ValueError(f"Not an image frame: {type(frame).__name__}")
+        self.start()
+        request = _Request(frame, embed)
+        self._queue.put(request)
+        return request.future
+
+    def analyze(self, frame: np.ndarray, embed: bool = False, timeout: Optional[float] = None) -> Dict:
+        """Blocking submit"""
+        return self.submit(frame, embed).result(timeout=timeout)
+
+    def _next_batch(self, timeout: Optional[float] = None) -> Optional[List[_Request]]:
+        """Block for a first request, then gather more for up to max_wait; None on timeout"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return None
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # Callers that gave up don't need a result
+        return [r for r in batch if r.future.set_running_or_notify_cancel()]
+
+    def _complete(self, batch: List[_Request], infer) -> bool:
+        """Run a batch and resolve its futures; False if it failed"""
+        started = time.perf_counter()
+        try:
+            results = infer(batch)
+            for request, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
+            return True
+        except Exception as e:
+            logger.error(f"Inference batch error: {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return False
+        finally:
+            self.batches += 1
+            self.frames += len(batch)
+            self.last_batch_ms = (time.perf_counter() - started) * 1000
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._complete(batch, self._infer)
+
+    def _infer(self, batch: List[_Request]) -> List[Dict]:
+        return self.models.infer([(r.frame, r.embed) for r in batch])
+
+    def stats(self) -> Dict:
+        return {
+            "mode": "thread",
+            "batched": self.models.batched,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "frames": self.frames,
+            "mean_batch_size": self.frames / self.batches if self.batches else 0.0,
+            "last_batch_ms": self.last_batch_ms
+        }
+
+
+def _attach_shared_memory(name: str) -> SharedMemory:
+    """Open the parent's buffer without letting this process's tracker unlink it on exit"""
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class _WorkerProcess:
+    """One model process: a child interpreter running this file, plus its frame buffer"""
+
+    def __init__(self, index: int, max_batch: int):
+        self.index = index
+        frame_bytes = MAX_SHARED_FRAME[0] * MAX_SHARED_FRAME[1] * 3
+        self.shm = SharedMemory(create=True, size=max_batch * frame_bytes)
+        self.proc: Optional[subprocess.Popen] = None
+        self.conn: Optional[connection.Connection] = None
+        self.restarts = 0
+        self.started_at = 0.0
+
+    def start(self, startup_timeout: float):
+        """Launch the child, authenticate its connection and wait until its models are loaded"""
+        authkey = secrets.token_bytes(32)
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(1)
+            listener.settimeout(1.0)
+            env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+            self.proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--serve",
+                 str(listener.getsockname()[1]), self.shm.name],
+                env=env,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                try:
+                    sock, _ = listener.accept()
+                    break
+                except socket.timeout:
+                    if self.proc.poll() is not None:
+                        raise RuntimeError(f"worker exited with code {self.proc.returncode}")
+                    if time.monotonic() > deadline:
+                        raise TimeoutError("worker did not connect")
+        finally:
+            listener.close()
+
+        sock.setblocking(True)
+        self.conn = connection.Connection(sock.detach())
+        # Same mutual challenge a multiprocessing Listener performs
+        connection.deliver_challenge(self.conn, authkey)
+        connection.answer_challenge(self.conn, authkey)
+
+        if not self.conn.poll(max(0.0, deadline - time.monotonic())):
+            raise TimeoutError("worker did not finish loading models")
+        message = self.conn.recv()
+        if message[0] != "ready":
+            raise RuntimeError(f"worker failed to start: {message[1]}")
+        self.started_at = time.time()
+        logger.info(f"Inference process {self.index} ready (pid {self.proc.pid})")
+
+    def infer(self, batch: List[_Request], timeout: float) -> List[Dict]:
+        """Copy the frames into shared memory and wait for the child's results"""
+        specs = []
+        offset = 0
+        for request in batch:
+            frame = request.frame
+            if frame.shape[0] > MAX_SHARED_FRAME[0] or frame.shape[1] > MAX_SHARED_FRAME[1]:
+                scale = min(MAX_SHARED_FRAME[0] / frame.shape[0], MAX_SHARED_FRAME[1] / frame.shape[1])
+                frame = cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)),
+                                   interpolation=cv2.INTER_AREA)
+            frame = np.ascontiguousarray(frame, dtype=np.uint8)
+            np.ndarray(frame.shape, np.uint8, buffer=self.shm.buf, offset=offset)[...] = frame
+            specs.append((offset, frame.shape, request.embed))
+            offset += frame.nbytes
+
+        self.conn.send(("batch", specs))
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"inference process {self.index} timed out")
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def ping(self, timeout: float) -> bool:
+        try:
+            self.conn.send(("ping",))
+            return self.conn.poll(timeout) and self.conn.recv()[0] == "pong"
+        except (OSError, EOFError):
+            return False
+
+    def is_alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def is_ready(self) -> bool:
+        """Past model loading and still running"""
+        return self.started_at > 0 and self.is_alive()
+
+    def kill(self):
+        self.started_at = 0.0
+        if self.conn is not None:
+            try:
+                self.conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.proc = None
+
+    def close(self):
+        self.kill()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ProcessInferencePool(InferenceWorker):
+    """
+    Same interface as InferenceWorker, but batches run in N model processes.
+    Each process has a dispatcher thread here that feeds it from the shared
+    queue, pings it while idle and restarts it when it dies or hangs.
+    """
+
+    def __init__(self, processes: int = Config.INFERENCE_WORKERS,
+                 max_batch: int = Config.INFERENCE_BATCH_SIZE,
+                 max_wait: float = Config.INFERENCE_BATCH_WAIT_MS / 1000,
+                 timeout: float = Config.INFERENCE_TIMEOUT,
+                 startup_timeout: float = Config.INFERENCE_STARTUP_TIMEOUT,
+                 health_interval: float = 10.0):
+        super().__init__(max_batch=max_batch, max_wait=max_wait)
+        self.process_count = max(1, processes)
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.health_interval = health_interval
+        self._workers: List[_WorkerProcess] = []
+        self._threads: List[Thread] = []
+        self._running = False
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for index in range(self.process_count):
+                worker = _WorkerProcess(index, self.max_batch)
+                thread = Thread(target=self._dispatch, args=(worker,), name=f"inference-dispatch-{index}", daemon=True)
+                self._workers.append(worker)
+                self._threads.append(thread)
+                thread.start()
+        logger.info(f"Inference pool started ({self.process_count} processes, batch {self.max_batch})")
+
+    def stop(self):
+        """Stop the model processes and free their buffers"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        for thread in self._threads:
+            # Idle dispatchers notice within health_interval; they are daemons either way
+            thread.join(timeout=1)
+        for worker in self._workers:
+            worker.close()
+        self._workers.clear()
+        self._threads.clear()
+        logger.info("Inference pool stopped")
+
+    def warm_up(self):
+        """Start the processes and wait until every one has its models loaded"""
+        self.start()
+        deadline = time.monotonic() + self.startup_timeout
+        while not all(worker.is_ready() for worker in list(self._workers)):
+            if time.monotonic() > deadline:
+                raise TimeoutError("inference processes did not become ready")
+            time.sleep(0.2)
+        return self
+
+    def _dispatch(self, worker: _WorkerProcess):
+        backoff = 1.0
+        while self._running:
+            if not worker.is_alive():
+                try:
+                    worker.kill()
+                    worker.start(self.startup_timeout)
+                    backoff = 1.0
+                except Exception as e:
+                    logger.error(f"Inference process {worker.index} failed to start: {e}")
+                    worker.kill()
+                    worker.restarts += 1
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+
+            batch = self._next_batch(timeout=self.health_interval)
+            if batch is None:
+                # Idle: make sure the process still answers
+                if self._running and not worker.ping(timeout=5.0):
+                    logger.warning(f"Inference process {worker.index} failed health check, restarting")
+                    worker.kill()
+                    worker.restarts += 1
+                continue
+            if not batch:
+                continue
+
+            if not self._complete(batch, lambda b: worker.infer(b, self.timeout)):
+                if not worker.is_alive() or not worker.ping(timeout=1.0):
+                    logger.warning(f"Inference process {worker.index} stopped responding, restarting")
+                    worker.kill()
+                    worker.restarts += 1
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        stats["mode"] = "process"
+        stats.pop("batched")
+        stats["processes"] = [
+            {
+                "index": worker.index,
+                "pid": worker.proc.pid if worker.proc else None,
+                "alive": worker.is_alive(),
+                "restarts": worker.restarts,
+                "uptime": time.time() - worker.started_at if worker.is_alive() else 0.0
+            }
+            for worker in list(self._workers)
+        ]
+        return stats
+
+
+def _serve(port: int, shm_name: str):
+    """Child side of a model process: load models, then answer batches over the connection"""
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENV))
+    conn = connection.Client(("127.0.0.1", port), authkey=authkey)
+    shm = _attach_shared_memory(shm_name)
+    models = FaceModels()
+    try:
+        models.load()
+    except Exception as e:
+        conn.send(("error", f"model load failed: {e}"))
+        return
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "ping":
+            conn.send(("pong",))
+        elif message[0] == "batch":
+            try:
+                items = [
+                    (np.ndarray(shape, np.uint8, buffer=shm.buf, offset=offset), embed)
+                    for offset, shape, embed in message[1]
+                ]
+                results = [
+                    # Exceptions don't always pickle; the message is what the caller logs
+                    RuntimeError(f"{type(r).__name__}: {r}") if isinstance(r, Exception) else r
+                    for r in models.infer(items)
+                ]
+                del items
+                conn.send(("ok", results))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+        elif message[0] == "stop":
+            break
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a failed batch still holds a view; the OS reclaims it on exit
+
+
+# Global instance
+if Config.INFERENCE_MODE == "process":
+    inference_worker = ProcessInferencePool()
+else:
+    inference_worker = InferenceWorker()
+
+model_registry.register("face_models", inference_worker.warm_up)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--serve":
+        _serve(int(sys.argv[2]), sys.argv[3])
+    else:
+        print(f"usage: {sys.argv[0]} --serve PORT SHARED_MEMORY_NAME (started by ProcessInferencePool)")
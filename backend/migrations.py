@@ -0,0 +1,274 @@
+"""
+Versioned schema migrations for ROOMie's SQLite database
+Each migration runs once, in order, inside its own transaction.
+The applied version is tracked in PRAGMA user_version.
+"""
+import json
+from typing import Awaitable, Callable, List, Tuple
+import aiosqlite
+import numpy as np
+from logger import setup_logger
+
+logger = setup_logger("migrations")
+
+# Epoch seconds "now" as an SQL expression, used for column defaults
+SQL_NOW_EPOCH = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Calibration embeddings are little-endian float32 BLOBs
+EMBEDDING_DTYPE = np.dtype("<f4")
+LEGACY_EMBEDDING_MODEL = "Facenet"  # the only model calibration used before v5
+
+
+async def _column_names(db: aiosqlite.Connection, table: str) -> List[str]:
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+
+async def _create_baseline(db: aiosqlite.Connection):
+    """Original schema; also upgrades databases created before user accounts existed"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            emotion TEXT,
+            sentiment TEXT,
+            personality TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS emotion_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            emotion TEXT NOT NULL,
+            confidence REAL,
+            mood_state TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id INTEGER,
+            key TEXT,
+            value TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, key),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS emotion_calibration (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            emotion TEXT NOT NULL,
+            embedding TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Columns added after the first release
+    legacy_columns = [
+        ("users", "password_hash", "TEXT"),
+        ("conversations", "user_id", "INTEGER"),
+        ("emotion_history", "user_id", "INTEGER"),
+    ]
+    for table, column, column_type in legacy_columns:
+        if column not in await _column_names(db, table):
+            logger.info(f"Adding {table}.{column}")
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+async def _epoch_timestamps(db: aiosqlite.Connection):
+    """Store conversation and emotion timestamps as integer epoch seconds"""
+    # Existing rows hold CURRENT_TIMESTAMP text (UTC), which strftime('%s') converts
+    to_epoch = f"COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), {SQL_NOW_EPOCH})"
+
+    await db.execute(f"""
+        CREATE TABLE conversations_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timestamp INTEGER NOT NULL DEFAULT ({SQL_NOW_EPOCH}),
+            user_message TEXT NOT NULL,
+            bot_response TEXT NOT NULL,
+            emotion TEXT,
+            sentiment TEXT,
+            personality TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    await db.execute(f"""
+        INSERT INTO conversations_new
+            (id, user_id, timestamp, user_message, bot_response, emotion, sentiment, personality)
+        SELECT id, user_id, {to_epoch}, user_message, bot_response, emotion, sentiment, personality
+        FROM conversations
+    """)
+    await db.execute("DROP TABLE conversations")
+    await db.execute("ALTER TABLE conversations_new RENAME TO conversations")
+
+    await db.execute(f"""
+        CREATE TABLE emotion_history_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timestamp INTEGER NOT NULL DEFAULT ({SQL_NOW_EPOCH}),
+            emotion TEXT NOT NULL,
+            confidence REAL,
+            mood_state TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    await db.execute(f"""
+        INSERT INTO emotion_history_new (id, user_id, timestamp, emotion, confidence, mood_state)
+        SELECT id, user_id, {to_epoch}, emotion, confidence, mood_state
+        FROM emotion_history
+    """)
+    await db.execute("DROP TABLE emotion_history")
+    await db.execute("ALTER TABLE emotion_history_new RENAME TO emotion_history")
+
+
+async def _history_indexes(db: aiosqlite.Connection):
+    """Composite indexes for per-user, time-ordered history queries"""
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversations_user_time "
+        "ON conversations (user_id, timestamp)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_emotion_history_user_time "
+        "ON emotion_history (user_id, timestamp)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_emotion_calibration_user "
+        "ON emotion_calibration (user_id)"
+    )
+
+
+async def _emotion_rollups(db: aiosqlite.Connection):
+    """Hourly and daily per-user emotion counts, backfilled from emotion_history"""
+    for table, bucket_seconds in (("emotion_rollup_hourly", 3600), ("emotion_rollup_daily", 86400)):
+        await db.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                emotion TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                confidence_sum REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, bucket, emotion)
+            ) WITHOUT ROWID
+        """)
+        await db.execute(f"""
+            INSERT INTO {table} (user_id, bucket, emotion, count, confidence_sum)
+            SELECT user_id, timestamp - timestamp % {bucket_seconds}, emotion,
+                   COUNT(*), COALESCE(SUM(confidence), 0)
+            FROM emotion_history
+            WHERE user_id IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+
+
+async def _binary_embeddings(db: aiosqlite.Connection):
+    """Store calibration embeddings as float32 BLOBs tagged with their dimension and model"""
+    await db.execute("""
+        CREATE TABLE emotion_calibration_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            emotion TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            dim INTEGER NOT NULL,
+            model_name TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    # SQLite can't pack floats, so existing JSON rows are converted here
+    async with db.execute(
+        "SELECT id, user_id, emotion, embedding, created_at FROM emotion_calibration"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    converted = []
+    for row_id, user_id, emotion, embedding, created_at in rows:
+        try:
+            vector = np.asarray(json.loads(embedding), dtype=EMBEDDING_DTYPE)
+        except (TypeError, ValueError):
+            logger.warning(f"Dropping calibration sample {row_id}: unreadable embedding")
+            continue
+        if vector.ndim != 1 or not vector.size:
+            logger.warning(f"Dropping calibration sample {row_id}: not a vector")
+            continue
+        converted.append(
+            (row_id, user_id, emotion, vector.tobytes(), vector.size, LEGACY_EMBEDDING_MODEL, created_at)
+        )
+    await db.executemany(
+        "INSERT INTO emotion_calibration_new "
+        "(id, user_id, emotion, embedding, dim, model_name, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        converted
+    )
+
+    await db.execute("DROP TABLE emotion_calibration")
+    await db.execute("ALTER TABLE emotion_calibration_new RENAME TO emotion_calibration")
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_emotion_calibration_user "
+        "ON emotion_calibration (user_id, model_name)"
+    )
+
+
+# (version, description, migration) — append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]] = [
+    (1, "baseline schema", _create_baseline),
+    (2, "integer epoch timestamps", _epoch_timestamps),
+    (3, "per-user history indexes", _history_indexes),
+    (4, "emotion rollup tables", _emotion_rollups),
+    (5, "binary calibration embeddings", _binary_embeddings),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    async with db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+        return row[0]
+
+
+async def apply_migrations(db: aiosqlite.Connection, target: int = SCHEMA_VERSION) -> int:
+    """Bring the database up to the target version and return the resulting version"""
+    current = await get_schema_version(db)
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {current} is newer than this code ({SCHEMA_VERSION})"
+        )
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        try:
+            await db.execute("BEGIN")
+            await migrate(db)
+            # PRAGMA doesn't accept bound parameters; version is an int from MIGRATIONS
+            await db.execute(f"PRAGMA user_version = {int(version)}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.error(f"Migration {version} failed, rolled back")
+            raise
+        current = version
+
+    return current
@@ -0,0 +1,114 @@
+"""
+Lazy model registry for ROOMie
+Heavy imports (DeepFace/TensorFlow, transformers) and model builds happen on
+first use or in a background warm-up, so the server accepts connections at once
+"""
+import importlib
+import time
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List, Optional
+from logger import setup_logger
+
+logger = setup_logger("model_registry")
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class _Entry:
+    __slots__ = ("loader", "warm", "state", "value", "error", "seconds", "lock")
+
+    def __init__(self, loader: Callable[[], Any], warm: bool):
+        self.loader = loader
+        self.warm = warm  # part of the startup warm-up
+        self.state = PENDING
+        self.value = None
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+        self.lock = Lock()
+
+
+class ModelRegistry:
+    """Named loaders that run once, on first get() or during warm_up()"""
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = Lock()
+        self._warm_thread: Optional[Thread] = None
+
+    def register(self, name: str, loader: Callable[[], Any], warm: bool = True):
+        """Add a loader; warm=False ones load only when first used"""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(loader, warm)
+
+    def get(self, name: str) -> Any:
+        """Return the loaded object, loading it now if needed; re-raises load failures"""
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.value
+        with entry.lock:
+            if entry.state != READY:
+                entry.state = LOADING
+                started = time.perf_counter()
+                try:
+                    entry.value = entry.loader()
+                    entry.state = READY
+                    entry.error = None
+                except Exception as e:
+                    entry.state = FAILED
+                    entry.error = str(e)
+                    raise
+                finally:
+                    entry.seconds = time.perf_counter() - started
+                logger.info(f"Loaded {name} in {entry.seconds:.2f} s")
+            return entry.value
+
+    def peek(self, name: str) -> Any:
+        """The loaded object, or None without waiting if it hasn't loaded"""
+        entry = self._entries[name]
+        return entry.value if entry.state == READY else None
+
+    def warm_up(self, names: Optional[List[str]] = None) -> Thread:
+        """Load the warm-up set (or the given names) on a background thread"""
+        with self._lock:
+            if self._warm_thread is not None and self._warm_thread.is_alive():
+                return self._warm_thread
+            if names is None:
+                names = [name for name, entry in self._entries.items() if entry.warm]
+            self._warm_thread = Thread(target=self._warm, args=(names,), name="model-warmup", daemon=True)
+            self._warm_thread.start()
+        return self._warm_thread
+
+    def _warm(self, names: List[str]):
+        started = time.perf_counter()
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Warm-up of {name} failed: {e}")
+        logger.info(f"Model warm-up finished in {time.perf_counter() - started:.2f} s")
+
+    def ready(self) -> bool:
+        """True once every warm-up model has loaded"""
+        return all(entry.state == READY for entry in self._entries.values() if entry.warm)
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "state": entry.state,
+                "seconds": round(entry.seconds, 3),
+                "error": entry.error
+            }
+            for name, entry in list(self._entries.items())
+        }
+
+
+# Global instance
+model_registry = ModelRegistry()
+
+# Not warmed here: in process mode only the model processes need TensorFlow, and
+# in thread mode the "face_models" warm-up imports it on the way to building models
+model_registry.register("deepface", lambda: importlib.import_module("deepface").DeepFace, warm=False)
@@ -0,0 +1,117 @@
+"""
+Cheap change detection in front of emotion inference for ROOMie
+Compares a tiny grayscale copy of each frame with the last analyzed one and
+checks that a face is present, so an idle scene doesn't cost a model run
+"""
+import time
+from threading import Lock
+from typing import Dict, Optional
+import cv2
+import numpy as np
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger("motion_gate")
+
+THUMBNAIL_SIZE = (64, 48)  # (width, height) used for the frame difference
+FACE_CHECK_WIDTH = 160  # width the Haar cascade runs at
+
+_face_cascade = None
+_cascade_lock = Lock()
+
+
+def _get_face_cascade():
+    """OpenCV's bundled frontal face cascade, loaded once; None when unavailable"""
+    global _face_cascade
+    with _cascade_lock:
+        if _face_cascade is None:
+            try:
+                path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+                cascade = cv2.CascadeClassifier(path)
+                if cascade.empty():
+                    raise IOError(f"cascade not found at {path}")
+            except Exception as e:
+                # OpenCV 5 moved the cascades to the contrib package
+                logger.warning(f"Face cascade unavailable ({e}), face check disabled")
+                cascade = False
+            _face_cascade = cascade
+        return _face_cascade or None
+
+
+class MotionGate:
+    """
+    Decides whether a frame is worth a full inference.
+    Skips when the scene barely changed since the last analyzed frame, or when
+    no face is visible; a result older than max_age is always refreshed.
+    """
+
+    def __init__(self, diff_threshold: float = Config.MOTION_DIFF_THRESHOLD,
+                 max_age: float = Config.MOTION_MAX_SKIP_SECONDS,
+                 face_check: bool = Config.MOTION_FACE_CHECK,
+                 enabled: bool = Config.MOTION_GATE_ENABLED):
+        self.diff_threshold = diff_threshold  # mean absolute gray level change, 0-255
+        self.max_age = max_age
+        self.face_check = face_check
+        self.enabled = enabled
+        self._reference: Optional[np.ndarray] = None
+        self._last_inference = 0.0
+        self._lock = Lock()
+        self.checked = 0
+        self.inferred = 0
+        self.skipped_static = 0
+        self.skipped_no_face = 0
+
+    def should_infer(self, frame: np.ndarray) -> bool:
+        """True when the frame should go to the model; the caller reuses its last result otherwise"""
+        with self._lock:
+            self.checked += 1
+            if not self.enabled:
+                self.inferred += 1
+                return True
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            thumbnail = cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+            stale = time.monotonic() - self._last_inference >= self.max_age
+
+            if not stale and self._reference is not None:
+                change = float(np.abs(thumbnail - self._reference).mean())
+                if change < self.diff_threshold:
+                    self.skipped_static += 1
+                    return False
+
+            # Something moved (or the result is old): only bother the model if someone is there
+            self._reference = thumbnail
+            if not stale and self.face_check and not self._has_face(gray):
+                self.skipped_no_face += 1
+                return False
+
+            self._last_inference = time.monotonic()
+            self.inferred += 1
+            return True
+
+    def _has_face(self, gray: np.ndarray) -> bool:
+        cascade = _get_face_cascade()
+        if cascade is None:
+            return True
+        scale = FACE_CHECK_WIDTH / gray.shape[1]
+        small = cv2.resize(gray, (FACE_CHECK_WIDTH, max(1, int(gray.shape[0] * scale))),
+                           interpolation=cv2.INTER_AREA) if scale < 1 else gray
+        faces = cascade.detectMultiScale(small, scaleFactor=1.2, minNeighbors=4, minSize=(24, 24))
+        return len(faces) > 0
+
+    def reset(self):
+        """Force the next frame through"""
+        with self._lock:
+            self._reference = None
+            self._last_inference = 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            skipped = self.skipped_static + self.skipped_no_face
+            return {
+                "checked": self.checked,
+                "inferred": self.inferred,
+                "skipped_static": self.skipped_static,
+                "skipped_no_face": self.skipped_no_face,
+                "saved_ratio": skipped / self.checked if self.checked else 0.0
+            }
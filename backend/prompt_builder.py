@@ -0,0 +1,152 @@
+"""
+Prompt assembly for ROOMie
+System prompts are rendered once per personality, and conversation history
+is kept newest-first until the prompt's token budget is spent; older turns
+are folded into a short note instead of being sent in full
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional
+import personality
+from personality import PERSONALITIES
+from config import Config
+from logger import setup_logger
+from model_registry import model_registry
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = setup_logger("prompt_builder")
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators around each chat message
+REPLY_PRIMING_TOKENS = 3  # every reply is primed with an assistant header
+CHARS_PER_TOKEN = 4  # estimate used when tiktoken isn't available
+SUMMARY_SNIPPET_WORDS = 12
+
+# Static per personality, so it is rendered once and stays a stable prefix across requests
+PERSONA_TEMPLATE = """You are ROOMii, an emotionally intelligent AI roommate and friend.
+Your personality: {name} — {style}.
+Speaking style: {prompt_tone}
+Your goal: respond in a friendly, natural, and emotionally aware way.
+Keep your tone conversational, not robotic.
+Never repeat exact phrasing — sound like a genuine friend who listens and cares.
+Keep responses concise (2-3 sentences max) unless the user asks for more detail."""
+
+MOOD_TEMPLATE = "The user's detected emotion is {emotion}, and their voice sentiment is {sentiment}."
+
+
+def _load_encoding():
+    """tiktoken encoding for the configured model, or None to estimate from length"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(Config.AI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails offline
+        logger.warning(f"tiktoken unavailable ({e}), estimating token counts")
+        return None
+
+
+_encoding_requested = False
+
+
+def _encoding():
+    """The encoding once loaded; never blocks, since prompts are built on the shared event loop"""
+    global _encoding_requested
+    encoding = model_registry.peek("token_encoding")
+    if encoding is None and tiktoken is not None and not _encoding_requested:
+        # Usually loaded by the startup warm-up already; otherwise load it off the loop
+        _encoding_requested = True
+        model_registry.warm_up(["token_encoding"])
+    return encoding
+
+
+@lru_cache(maxsize=4096)
+def _encoded_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in a piece of text; exact counts are cached, since history repeats across requests"""
+    if _encoding() is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return _encoded_tokens(text)
+
+
+def message_tokens(content: str) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+@lru_cache(maxsize=64)
+def persona_prompt(name: str) -> str:
+    """System prompt for a personality, without the per-request mood line"""
+    persona = PERSONALITIES.get(name, PERSONALITIES["neutral"])
+    return PERSONA_TEMPLATE.format(name=name, style=persona["style"], prompt_tone=persona["prompt_tone"])
+
+
+def _summarize(messages: List[Dict], budget: int) -> Optional[str]:
+    """A one-line note of what the user said in turns that didn't fit, newest first"""
+    note = "Earlier in this conversation the user mentioned: "
+    used = count_tokens(note)
+    snippets = []
+    for message in reversed(messages):
+        if message.get("role", "user") != "user" or not message.get("content"):
+            continue
+        words = message["content"].split()
+        snippet = " ".join(words[:SUMMARY_SNIPPET_WORDS]) + ("…" if len(words) > SUMMARY_SNIPPET_WORDS else "")
+        cost = count_tokens(snippet) + 1
+        if used + cost > budget:
+            break
+        snippets.append(snippet)
+        used += cost
+    return note + "; ".join(snippets) + "." if snippets else None
+
+
+def build_messages(
+    user_text: str,
+    emotion: str,
+    sentiment: str,
+    history: List[Dict] = None,
+    personality_name: str = None,
+    budget: int = Config.PROMPT_TOKEN_BUDGET
+) -> List[Dict]:
+    """Message list for the chat completions API, at most about `budget` prompt tokens"""
+    if personality_name is None:
+        personality_name = personality.current_persona
+    system = persona_prompt(personality_name) + "\n" + MOOD_TEMPLATE.format(emotion=emotion, sentiment=sentiment)
+
+    # The system prompt and the new message always go; history gets what's left
+    remaining = budget - REPLY_PRIMING_TOKENS - message_tokens(system) - message_tokens(user_text)
+    history = history or []
+    start = max(0, len(history) - Config.CONVERSATION_CONTEXT_LENGTH)
+    kept = []
+    cut = start
+    for i in range(len(history) - 1, start - 1, -1):
+        content = history[i].get("content", "")
+        if not content:
+            continue
+        cost = message_tokens(content)
+        if cost > remaining:
+            cut = i + 1
+            break
+        kept.append({"role": history[i].get("role", "user"), "content": content})
+        remaining -= cost
+    kept.reverse()
+    # An answer whose question was cut would reach the model with nothing to answer
+    while kept and kept[0]["role"] == "assistant":
+        remaining += message_tokens(kept.pop(0)["content"])
+
+    if cut > start:
+        summary = _summarize(history[start:cut], min(remaining, Config.PROMPT_SUMMARY_TOKENS))
+        if summary:
+            system += "\n" + summary
+        logger.debug(f"Prompt budget: dropped {cut - start} older messages, kept {len(kept)}")
+
+    return [{"role": "system", "content": system}] + kept + [{"role": "user", "content": user_text}]
+
+
+# tiktoken may download its encoding on first use; do that during warm-up
+model_registry.register("token_encoding", _load_encoding)
@@ -0,0 +1,12 @@
+"""
+Shared pytest setup for the ROOMie backend
+Run from backend/: python -m pytest tests
+"""
+import os
+import sys
+from pathlib import Path
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Config refuses to import without a key; tests never reach the API
+os.environ.setdefault("OPENAI_API_KEY", "test")
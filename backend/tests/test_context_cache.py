@@ -0,0 +1,51 @@
+from context_cache import ConversationContextCache
+
+
+def exchanges(first, last):
+    return [(i, f"q{i}", f"a{i}") for i in range(first, last + 1)]
+
+
+def test_ring_buffer_keeps_newest_in_order():
+    cache = ConversationContextCache(capacity=3, max_bytes=1_000_000)
+    cache.load(1, exchanges(1, 2), cache.generation(1))
+    for row_id, question, answer in exchanges(3, 5):
+        cache.append(1, row_id, question, answer)
+
+    context = cache.get(1, 3)
+    assert [m["content"] for m in context] == ["q3", "a3", "q4", "a4", "q5", "a5"]
+    assert [m["role"] for m in context[:2]] == ["user", "assistant"]
+    assert [m["content"] for m in cache.get(1, 1)] == ["q5", "a5"]
+
+
+def test_append_skips_rows_already_loaded():
+    cache = ConversationContextCache(capacity=5, max_bytes=1_000_000)
+    cache.load(1, exchanges(1, 3), cache.generation(1))
+    cache.append(1, 3, "q3", "a3")
+    assert len(cache.get(1, 5)) == 6
+
+
+def test_cold_user_misses_and_stays_cold_on_append():
+    cache = ConversationContextCache(capacity=3, max_bytes=1_000_000)
+    assert cache.get(1, 2) is None
+    cache.append(1, 1, "q1", "a1")
+    assert cache.get(1, 2) is None
+    assert cache.get(1, 4) is None  # more than the buffer holds
+
+
+def test_stale_load_is_discarded_after_a_write():
+    cache = ConversationContextCache(capacity=3, max_bytes=1_000_000)
+    token = cache.generation(1)
+    cache.append(1, 3, "q3", "a3")  # lands while the DB read is in flight
+    cache.load(1, exchanges(1, 2), token)
+    assert cache.get(1, 2) is None
+
+    cache.load(1, exchanges(1, 3), cache.generation(1))
+    assert cache.get(1, 1)[0]["content"] == "q3"
+
+
+def test_invalidate_discards_in_flight_load():
+    cache = ConversationContextCache(capacity=3, max_bytes=1_000_000)
+    token = cache.generation(1)
+    cache.invalidate(1)
+    cache.load(1, exchanges(1, 2), token)
+    assert cache.get(1, 2) is None
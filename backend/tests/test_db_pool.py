@@ -0,0 +1,56 @@
+import asyncio
+from db_pool import ConnectionPool
+
+
+def test_burst_never_opens_more_than_size(tmp_path):
+    async def main():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+        opened, in_use, peak = [], 0, 0
+        connect = pool._connect
+
+        async def counting_connect():
+            db = await connect()
+            opened.append(db)
+            return db
+        pool._connect = counting_connect
+
+        async def query():
+            nonlocal in_use, peak
+            async with pool.acquire() as db:
+                in_use += 1
+                peak = max(peak, in_use)
+                await db.execute("SELECT 1")
+                await asyncio.sleep(0.01)
+                in_use -= 1
+
+        await asyncio.gather(*(query() for _ in range(20)))
+        await pool.close()
+        return len(opened), peak
+
+    opened, peak = asyncio.run(main())
+    assert opened == 2
+    assert peak == 2
+
+
+def test_cancelled_waiter_does_not_leak_a_slot(tmp_path):
+    async def main():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with pool.acquire():
+                await release.wait()
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0.05)
+        waiter = asyncio.create_task(pool.acquire().__aenter__())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        release.set()
+        await held
+        # The slot came back: a new checkout doesn't hang
+        async with pool.acquire() as db:
+            await db.execute("SELECT 1")
+        await pool.close()
+
+    asyncio.run(asyncio.wait_for(main(), timeout=5))
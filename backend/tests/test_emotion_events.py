@@ -0,0 +1,48 @@
+import time
+
+from emotion_events import EmotionPublisher
+
+
+def recording_publisher(debounce):
+    publisher = EmotionPublisher(bucket_size=0.1, debounce=debounce)
+    received = []
+    publisher.subscribe(lambda room, payload: received.append((room, payload['emotion'], payload['confidence'])))
+    return publisher, received
+
+
+def test_same_bucket_is_not_redelivered():
+    publisher, received = recording_publisher(debounce=0)
+    publisher.publish("room", "happy", 0.72)
+    publisher.publish("room", "happy", 0.78)
+    publisher.publish("room", "happy", 0.81)
+    assert received == [("room", "happy", 0.72), ("room", "happy", 0.81)]
+    assert publisher.stats()["published"] == 3
+
+
+def test_changes_within_window_coalesce_to_newest():
+    publisher, received = recording_publisher(debounce=0.1)
+    publisher.publish("room", "happy", 0.9)
+    publisher.publish("room", "sad", 0.6)
+    publisher.publish("room", "angry", 0.7)
+    assert received == [("room", "happy", 0.9)]
+
+    time.sleep(0.3)
+    assert received == [("room", "happy", 0.9), ("room", "angry", 0.7)]
+
+
+def test_return_to_sent_state_cancels_pending_change():
+    publisher, received = recording_publisher(debounce=0.1)
+    publisher.publish("room", "happy", 0.9)
+    publisher.publish("room", "sad", 0.6)
+    publisher.publish("room", "happy", 0.93)
+    time.sleep(0.3)
+    assert received == [("room", "happy", 0.9)]
+
+
+def test_rooms_are_independent():
+    publisher, received = recording_publisher(debounce=10)
+    publisher.publish("a", "happy", 0.9)
+    publisher.publish("b", "happy", 0.9)
+    assert [room for room, _, _ in received] == ["a", "b"]
+    publisher.forget("a")
+    publisher.forget("b")
@@ -0,0 +1,50 @@
+from emotion_smoother import EmotionSmoother
+from emotion_detector import EmotionSession
+
+
+def frame(leader, score, runner_up="neutral"):
+    """Percentages like DeepFace's, with what's left of the leader on the runner-up"""
+    return {leader: score * 100, runner_up: (1 - score) * 100}
+
+
+def test_steady_stream_reports_frame_confidence():
+    smoother = EmotionSmoother(half_life=4.0, hysteresis=0.1)
+    for t in range(20):
+        emotion, confidence = smoother.update(frame("happy", 0.75), timestamp=t * 0.5)
+    assert emotion == "happy"
+    assert abs(confidence - 0.75) < 1e-6
+
+
+def test_session_keeps_steady_happy_above_threshold():
+    session = EmotionSession()
+    for _ in range(20):
+        emotion, confidence = session.smooth(frame("happy", 0.75))
+    assert emotion == "happy"
+    assert confidence >= 0.70
+
+
+def test_confidence_ignores_frames_another_emotion_led():
+    smoother = EmotionSmoother(half_life=4.0, hysteresis=0.1)
+    for t in range(20):
+        # Every fourth frame neutral edges ahead; happy still leads the average
+        scores = frame("neutral", 0.55, "happy") if t % 4 == 3 else frame("happy", 0.75)
+        emotion, confidence = smoother.update(scores, timestamp=t * 0.5)
+    assert emotion == "happy"
+    assert abs(confidence - 0.75) < 1e-6
+
+
+def test_hysteresis_holds_against_one_outlier_frame():
+    smoother = EmotionSmoother(half_life=4.0, hysteresis=0.1)
+    for t in range(10):
+        smoother.update(frame("happy", 0.8), timestamp=t * 0.5)
+    emotion, _ = smoother.update(frame("sad", 0.95, "happy"), timestamp=5.0)
+    assert emotion == "happy"
+
+
+def test_sustained_change_switches_state():
+    smoother = EmotionSmoother(half_life=1.0, hysteresis=0.1)
+    for t in range(10):
+        smoother.update(frame("happy", 0.8), timestamp=t * 0.5)
+    for t in range(10, 30):
+        emotion, _ = smoother.update(frame("sad", 0.9), timestamp=t * 0.5)
+    assert emotion == "sad"
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+import aiosqlite
+import numpy as np
+
+from migrations import LEGACY_EMBEDDING_MODEL, SCHEMA_VERSION, apply_migrations, get_schema_version
+
+
+async def migrate_legacy_calibration(path):
+    async with aiosqlite.connect(path) as db:
+        assert await apply_migrations(db, target=1) == 1
+        await db.executemany(
+            "INSERT INTO emotion_calibration (user_id, emotion, embedding) VALUES (?, ?, ?)",
+            [
+                (1, "happy", json.dumps([0.25, -1.5, 3.0])),
+                (1, "sad", "not json"),
+                (2, "neutral", json.dumps([1.0, 2.0])),
+            ]
+        )
+        await db.commit()
+
+        assert await apply_migrations(db) == SCHEMA_VERSION
+        assert await get_schema_version(db) == 5
+        async with db.execute(
+            "SELECT user_id, emotion, embedding, dim, model_name FROM emotion_calibration ORDER BY id"
+        ) as cursor:
+            return await cursor.fetchall()
+
+
+def test_json_embeddings_become_float32_blobs(tmp_path):
+    rows = asyncio.run(migrate_legacy_calibration(str(tmp_path / "roomie.db")))
+
+    assert [(user_id, emotion) for user_id, emotion, *_ in rows] == [(1, "happy"), (2, "neutral")]
+    _, _, blob, dim, model_name = rows[0]
+    assert isinstance(blob, bytes)
+    assert dim == 3
+    assert model_name == LEGACY_EMBEDDING_MODEL
+    np.testing.assert_array_equal(np.frombuffer(blob, dtype="<f4"), [0.25, -1.5, 3.0])
+    assert rows[1][3] == 2
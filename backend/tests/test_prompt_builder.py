@@ -0,0 +1,35 @@
+import pytest
+import prompt_builder
+from prompt_builder import build_messages, message_tokens
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Length estimates keep budgets deterministic whether or not tiktoken can load
+    monkeypatch.setattr(prompt_builder, "_encoding", lambda: None)
+
+
+def exchange(question, answer):
+    return [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+
+
+def base_cost(user_text):
+    system = build_messages(user_text, "neutral", "neutral", [], "neutral", budget=10_000)[0]["content"]
+    return prompt_builder.REPLY_PRIMING_TOKENS + message_tokens(system) + message_tokens(user_text)
+
+
+def test_history_never_starts_with_an_orphaned_answer():
+    history = exchange("hi", "hello!") + exchange("tell me a long story " * 40, "Once upon a time.")
+    # Room for the last answer but not the long question before it
+    budget = base_cost("and then?") + message_tokens("Once upon a time.") + 2
+    messages = build_messages("and then?", "neutral", "neutral", history, "neutral", budget=budget)
+    roles = [m["role"] for m in messages]
+    assert roles[0] == "system"
+    assert roles[1] == "user"
+    assert messages[-1]["content"] == "and then?"
+
+
+def test_whole_history_kept_when_it_fits():
+    history = exchange("hi", "hello!") + exchange("how are you?", "great, you?")
+    messages = build_messages("fine", "happy", "positive", history, "neutral", budget=10_000)
+    assert [m["content"] for m in messages[1:]] == ["hi", "hello!", "how are you?", "great, you?", "fine"]
@@ -0,0 +1,25 @@
+from tts_pipeline import SentenceSplitter
+
+
+def test_decimals_and_abbreviations_stay_intact():
+    splitter = SentenceSplitter(min_length=10)
+    sentences = splitter.feed("It costs 3.5 dollars today. Dr. Smith said hi, e.g. to you. ")
+    assert sentences == ["It costs 3.5 dollars today.", "Dr. Smith said hi, e.g. to you."]
+
+
+def test_initials_do_not_end_a_sentence():
+    splitter = SentenceSplitter(min_length=10)
+    assert splitter.feed("Ask J. R. Smith about it. ") == ["Ask J. R. Smith about it."]
+
+
+def test_decimal_split_across_chunks():
+    splitter = SentenceSplitter(min_length=10)
+    assert splitter.feed("The price is 3") == []
+    assert splitter.feed(".5 now. And") == ["The price is 3.5 now."]
+    assert splitter.flush() == "And"
+
+
+def test_short_sentences_merge_until_min_length():
+    splitter = SentenceSplitter(min_length=20)
+    assert splitter.feed("Ok. Sure thing. That works for me. ") == ["Ok. Sure thing. That works for me."]
+    assert splitter.flush() is None
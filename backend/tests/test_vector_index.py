@@ -0,0 +1,58 @@
+import numpy as np
+
+from vector_index import VectorIndex
+
+
+def clustered(n_clusters=20, per_cluster=50, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    vectors = np.repeat(centers, per_cluster, axis=0) + 0.1 * rng.normal(size=(n_clusters * per_cluster, dim))
+    labels = np.repeat(np.arange(n_clusters), per_cluster)
+    return vectors.astype(np.float32), labels, centers
+
+
+def test_ivf_recall_matches_flat_scan():
+    vectors, labels, centers = clustered()
+    flat = VectorIndex(dim=32, ivf_threshold=10_000)
+    ivf = VectorIndex(dim=32, ivf_threshold=100, nprobe=4)
+    flat.add(vectors, labels)
+    ivf.add(vectors, labels)
+    assert not flat.uses_ivf and ivf.uses_ivf
+
+    rng = np.random.default_rng(1)
+    queries = centers + 0.1 * rng.normal(size=centers.shape)
+    k = 10
+    found = 0
+    for query in queries:
+        exact, _ = flat.search(query, k)
+        approx, _ = ivf.search(query, k)
+        # Similarities identify the rows; IVF never beats the exact scan
+        assert approx[0] <= exact[0] + 1e-6
+        found += len(np.intersect1d(np.round(exact, 5), np.round(approx, 5)))
+    assert found / (k * len(queries)) >= 0.9
+
+
+def test_ivf_stays_searchable_as_rows_are_added():
+    vectors, labels, centers = clustered()
+    index = VectorIndex(dim=32, ivf_threshold=100, nprobe=4)
+    for start in range(0, len(vectors), 100):
+        index.add(vectors[start:start + 100], labels[start:start + 100])
+    assert len(index) == len(vectors)
+    label, _ = index.vote(centers[7], k=5)
+    assert label == 7
+
+
+def test_vote_is_weighted_by_similarity():
+    index = VectorIndex(dim=2)
+    # One very close neighbour outweighs two barely similar ones
+    index.add([[1.0, 0.0], [0.1, 1.0], [0.1, 1.0]], [0, 1, 1])
+    label, similarity = index.vote([1.0, 0.05], k=3)
+    assert label == 0
+    assert similarity > 0.99
+
+
+def test_vote_without_positive_neighbours():
+    index = VectorIndex(dim=2)
+    assert index.vote([1.0, 0.0], k=3) == (None, 0.0)
+    index.add([[-1.0, 0.0]], [0])
+    assert index.vote([1.0, 0.0], k=3) == (None, 0.0)
@@ -0,0 +1,143 @@
+"""
+Content-addressed TTS audio cache for ROOMie
+Repeated phrases are served from disk with no speech API round trip
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Dict, Optional
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger("tts_cache")
+
+LEGACY_PREFIX = "tmp"  # NamedTemporaryFile names used before clips were cached
+
+
+class TTSCache:
+    """Size-bounded LRU cache of synthesized speech files, keyed by content hash"""
+
+    SUFFIX = ".mp3"
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._total_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_existing()
+
+    @staticmethod
+    def make_key(text: str, voice: str, speed: float, model: str) -> str:
+        """Hash everything that changes the synthesized audio"""
+        payload = json.dumps([model, voice, speed, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def _load_existing(self):
+        """Index files left by a previous run, least recently used first"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.cache_dir.glob("*.part"):
+            # A write interrupted by a crash
+            path.unlink(missing_ok=True)
+        files = []
+        for path in self.cache_dir.glob(f"*{self.SUFFIX}"):
+            # Clips from before the cache were one-off temp files; indexing them
+            # (they're old, so evicted first) keeps the directory within budget
+            if len(path.stem) != 64 and not path.stem.startswith(LEGACY_PREFIX):
+                continue
+            stat = path.stat()
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+        self._evict()
+        if files:
+            logger.info(f"TTS cache loaded {len(self._entries)} clips ({self._total_bytes} bytes)")
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached clip for a key and mark it recently used"""
+        with self._lock:
+            if key in self._entries:
+                path = self._path(key)
+                if path.exists():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    try:
+                        # Keeps LRU order across restarts
+                        os.utime(path)
+                    except OSError:
+                        pass
+                    return path
+                # File removed behind our back
+                self._total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store a clip and evict least recently used clips over the size limit"""
+        path = self._path(key)
+        # Write to a temp file first so readers never see a partial clip
+        tmp_file = NamedTemporaryFile(delete=False, suffix=".part", dir=self.cache_dir)
+        try:
+            tmp_file.write(data)
+            tmp_file.close()
+            os.replace(tmp_file.name, path)
+        except Exception:
+            tmp_file.close()
+            if os.path.exists(tmp_file.name):
+                os.remove(tmp_file.name)
+            raise
+
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: Optional[str] = None):
+        """Drop oldest clips until the cache fits; caller holds the lock"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                break
+            del self._entries[key]
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"TTS cache eviction error: {e}")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+# Global instance; clips live in the served audio directory
+tts_cache = TTSCache(Config.AUDIO_DIR, Config.TTS_CACHE_MAX_MB * 1024 * 1024)
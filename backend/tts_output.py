@@ -1,10 +1,8 @@
 # backend/tts_output.py
-import os
 import openai
-from pathlib import Path
-from tempfile import NamedTemporaryFile
 import asyncio
 from config import Config
+from tts_cache import tts_cache
 from logger import setup_logger
 
 logger = setup_logger("tts_output")
@@ -30,6 +28,13 @@ def speak(text: str, tone: str = "neutral") -> str:
         
         speed = speed_map.get(tone.lower(), 1.0)
         
+        # Serve repeated phrases straight from the cache
+        cache_key = tts_cache.make_key(text, voice, speed, Config.TTS_MODEL)
+        cached_path = tts_cache.get(cache_key)
+        if cached_path:
+            logger.debug(f"TTS cache hit: {cached_path.name}")
+            return f"audio/{cached_path.name}"
+        
         logger.info(f"Generating TTS with voice '{voice}' for tone '{tone}' (speed: {speed})")
 
         # Generate speech with correct model name
@@ -40,20 +45,11 @@ def speak(text: str, tone: str = "neutral") -> str:
             speed=speed
         )
 
-        # Save temporary audio file
-        audio_dir = Path(Config.AUDIO_DIR)
-        audio_dir.mkdir(exist_ok=True)
-        
-        tmp_file = NamedTemporaryFile(
-            delete=False, 
-            suffix=".mp3",
-            dir=audio_dir
-        )
-        tmp_file.write(response.read())
-        tmp_file.close()
+        # Save to the cache; eviction handles cleanup
+        audio_path = tts_cache.put(cache_key, response.read())
 
-        logger.info(f"TTS audio saved: {tmp_file.name}")
-        return f"audio/{Path(tmp_file.name).name}"
+        logger.info(f"TTS audio saved: {audio_path}")
+        return f"audio/{audio_path.name}"
         
     except Exception as e:
         logger.error(f"TTS generation error: {e}")
@@ -64,14 +60,3 @@ async def speak_async(text: str, tone: str = "neutral") -> str:
     """Async TTS generation"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(None, speak, text, tone)
-
-
-def cleanup_audio_file(file_path: str):
-    """Delete audio file"""
-    try:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-            logger.debug(f"Cleaned up audio file: {file_path}")
-    except Exception as e:
-        logger.error(f"Audio cleanup error: {e}")
-
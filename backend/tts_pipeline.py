@@ -0,0 +1,173 @@
+"""
+Sentence-pipelined TTS for ROOMie
+Synthesizes each sentence of a streamed reply as soon as it is complete,
+so audio playback can start while the LLM is still generating
+"""
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition
+from typing import Callable, List, Optional, Tuple
+from tts_output import speak
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger("tts_pipeline")
+
+# Sentence-ending punctuation (plus closing quotes/brackets) followed by whitespace.
+# Requiring the whitespace keeps "3.5" or a half-streamed "..." from splitting early.
+SENTENCE_BOUNDARY = re.compile(r'[.!?…]+["\'”’)\]]*\s+')
+# Periods that don't end a sentence; single-letter initials ("J. Smith") are handled too
+ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "jr.", "sr.", "vs.", "e.g.", "i.e.", "approx.", "no."}
+
+# Shared by all pipelines so concurrent replies can't flood the speech API
+_tts_executor = ThreadPoolExecutor(
+    max_workers=Config.TTS_MAX_WORKERS,
+    thread_name_prefix="tts"
+)
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    word = text.rsplit(None, 1)[-1].rstrip("\"')]”’").lower()
+    return word in ABBREVIATIONS or (len(word) == 2 and word[0].isalpha() and word[1] == ".")
+
+
+class SentenceSplitter:
+    """Incrementally splits streamed text into complete sentences"""
+
+    def __init__(self, min_length: int = Config.TTS_MIN_SENTENCE_CHARS):
+        # Very short sentences ("Oh!") are merged into the next one
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text and return any sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_length and not _ends_with_abbreviation(candidate):
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        """Return whatever is left once the stream has ended"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return remainder or None
+
+
+class SentenceTTSPipeline:
+    """
+    Sends each completed sentence to TTS as soon as it is available and
+    delivers the resulting clips strictly in sentence order
+    """
+
+    def __init__(
+        self,
+        tone: str,
+        on_audio: Callable[[int, str], None],
+        is_cancelled: Callable[[], bool] = lambda: False,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.tone = tone
+        self.on_audio = on_audio
+        self.is_cancelled = is_cancelled
+        self.executor = executor or _tts_executor
+        self.splitter = SentenceSplitter()
+        self.audio_paths: List[str] = []
+        self._futures: List[Future] = []
+        self._next_index = 0
+        self._delivering = False  # one thread emits at a time, so clips stay in order
+        self._lock = Condition()
+
+    def feed(self, text: str):
+        """Feed streamed reply text; complete sentences go to TTS immediately"""
+        for sentence in self.splitter.feed(text):
+            self._submit(sentence)
+
+    def _submit(self, sentence: str):
+        if self.is_cancelled():
+            return
+        future = self.executor.submit(speak, sentence, self.tone)
+        with self._lock:
+            self._futures.append(future)
+        future.add_done_callback(lambda _: self._deliver_ready())
+
+    def _deliver_ready(self):
+        """Deliver finished clips in order; a clip waits until all earlier ones are out"""
+        with self._lock:
+            if self._delivering:
+                # The thread already delivering picks up this clip before it stops
+                return
+            self._delivering = True
+        try:
+            while True:
+                with self._lock:
+                    ready = self._take_ready()
+                    if not ready:
+                        self._delivering = False
+                        self._lock.notify_all()
+                        return
+                # Emitted outside the lock so a slow socket doesn't hold up new sentences
+                for index, audio_path in ready:
+                    try:
+                        self.on_audio(index, audio_path)
+                    except Exception as e:
+                        logger.error(f"Audio chunk delivery error: {e}")
+        except BaseException:
+            with self._lock:
+                self._delivering = False
+                self._lock.notify_all()
+            raise
+
+    def _take_ready(self) -> List[Tuple[int, str]]:
+        """Finished clips next in order, as (index, path); caller holds the lock"""
+        ready = []
+        while self._next_index < len(self._futures):
+            future = self._futures[self._next_index]
+            if not future.done():
+                break
+            index = self._next_index
+            self._next_index += 1
+
+            if future.cancelled() or future.exception():
+                continue
+            audio_path = future.result()
+            if not audio_path:
+                continue
+            if self.is_cancelled():
+                continue
+
+            self.audio_paths.append(audio_path)
+            ready.append((index, audio_path))
+        return ready
+
+    def finish(self, timeout: Optional[float] = None) -> List[str]:
+        """Synthesize the trailing text and wait until every clip is delivered"""
+        remainder = self.splitter.flush()
+        if remainder:
+            self._submit(remainder)
+
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                logger.error(f"Sentence TTS error: {e}")
+        self._deliver_ready()
+        with self._lock:
+            # Another thread may still be emitting the last clips
+            self._lock.wait_for(lambda: not self._delivering, timeout=timeout)
+        return self.audio_paths
+
+    def cancel(self):
+        """Drop sentences that haven't started synthesizing yet"""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        self._deliver_ready()
@@ -0,0 +1,149 @@
+"""
+Small in-memory vector index for ROOMie
+Cosine k-NN over L2-normalized float32 rows: an exact scan for small sets and
+an inverted-file (IVF) layout once a set grows past a threshold
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from config import Config
+
+KMEANS_ITERATIONS = 10
+MIN_LISTS = 4
+MAX_LISTS = 256
+
+
+def normalize(matrix) -> np.ndarray:
+    """L2-normalize rows as contiguous float32, leaving all-zero rows as they are"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.where(norms == 0, 1, norms), dtype=np.float32)
+
+
+class _InvertedLists:
+    """Spherical k-means centroids, each with the ids of the rows closest to it"""
+
+    def __init__(self, vectors: np.ndarray, nlist: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            # An empty list keeps its previous centroid
+            filled = np.bincount(assignment, minlength=nlist) > 0
+            centroids[filled] = normalize(sums[filled])
+        self.centroids = centroids
+        self._ids: List[List[int]] = [[] for _ in range(nlist)]
+        self._arrays: List[Optional[np.ndarray]] = [None] * nlist
+        self.add(vectors, 0)
+
+    def add(self, vectors: np.ndarray, first_id: int):
+        for offset, list_no in enumerate(np.argmax(vectors @ self.centroids.T, axis=1)):
+            self._ids[list_no].append(first_id + offset)
+            self._arrays[list_no] = None
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Ids in the nprobe lists whose centroids are closest to the query"""
+        scores = self.centroids @ query
+        nprobe = min(nprobe, len(scores))
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        arrays = []
+        for list_no in probe:
+            if self._arrays[list_no] is None:
+                self._arrays[list_no] = np.asarray(self._ids[list_no], dtype=np.int64)
+            arrays.append(self._arrays[list_no])
+        return np.concatenate(arrays)
+
+
+class VectorIndex:
+    """
+    Labelled vectors searched by cosine similarity.
+    Scans every row exactly until ivf_threshold rows, then clusters them into
+    about sqrt(n) lists and scans only the nprobe closest lists per query.
+    Rows can be added at any time; the lists are rebuilt whenever the index
+    has doubled since they were last trained.
+    """
+
+    def __init__(self, dim: int, ivf_threshold: int = Config.VECTOR_INDEX_IVF_THRESHOLD,
+                 nprobe: int = Config.VECTOR_INDEX_NPROBE):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.size = 0
+        self._vectors = np.empty((16, dim), dtype=np.float32)
+        self._labels = np.empty(16, dtype=np.int32)
+        self._ivf: Optional[_InvertedLists] = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self.size]
+
+    @property
+    def labels(self) -> np.ndarray:
+        return self._labels[:self.size]
+
+    @property
+    def uses_ivf(self) -> bool:
+        return self._ivf is not None
+
+    def add(self, vectors, labels):
+        """Append vectors (normalized here) with their integer labels"""
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        labels = np.asarray(labels, dtype=np.int32).reshape(-1)
+        if len(vectors) != len(labels):
+            raise ValueError(f"{len(vectors)} vectors but {len(labels)} labels")
+
+        needed = self.size + len(vectors)
+        if needed > len(self._vectors):
+            capacity = max(needed, 2 * len(self._vectors))
+            self._vectors = np.resize(self._vectors, (capacity, self.dim))
+            self._labels = np.resize(self._labels, capacity)
+        self._vectors[self.size:needed] = vectors
+        self._labels[self.size:needed] = labels
+        first_id, self.size = self.size, needed
+
+        if self.size >= self.ivf_threshold and (self._ivf is None or self.size >= 2 * self._trained_size):
+            self._train()
+        elif self._ivf is not None:
+            self._ivf.add(vectors, first_id)
+
+    def _train(self):
+        nlist = int(np.clip(np.sqrt(self.size), MIN_LISTS, MAX_LISTS))
+        self._ivf = _InvertedLists(self.vectors, nlist)
+        self._trained_size = self.size
+
+    def search(self, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(similarities, labels) of the k nearest rows, most similar first"""
+        if not self.size:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32)
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        if self._ivf is not None:
+            ids = self._ivf.candidates(query, self.nprobe)
+            scores = self._vectors[ids] @ query
+        else:
+            ids = None
+            scores = self.vectors @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if ids is None else ids[top]
+        return scores[top], self._labels[rows]
+
+    def vote(self, query, k: int) -> Tuple[Optional[int], float]:
+        """
+        Similarity-weighted vote among the k nearest rows.
+        Returns the winning label and its neighbours' mean similarity, or
+        (None, 0.0) when no neighbour is positively similar.
+        """
+        similarities, labels = self.search(query, k)
+        weights = np.clip(similarities, 0, None)
+        if not len(weights) or weights.max() <= 0:
+            return None, 0.0
+        totals = np.bincount(labels, weights=weights)
+        winner = int(np.argmax(totals))
+        return winner, float(similarities[labels == winner].mean())
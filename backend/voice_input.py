@@ -1,11 +1,17 @@
 import speech_recognition as sr
-from transformers import pipeline
+from model_registry import model_registry
 
-# Load sentiment analysis pipeline
-sentiment_analyzer = pipeline("sentiment-analysis")
+
+def _load_sentiment_analyzer():
+    from transformers import pipeline
+    return pipeline("sentiment-analysis")
+
+
+# Sentiment analysis pipeline, built on first use
+model_registry.register("sentiment", _load_sentiment_analyzer, warm=False)
 
 def analyze_sentiment(text):
-    result = sentiment_analyzer(text)[0]
+    result = model_registry.get("sentiment")(text)[0]
     return result['label'].lower()
 
 def get_voice_sentiment(retry_count=0):
@@ -1,23 +1,30 @@
 """
 WebSocket handler for real-time communication with ROOMie frontend
 """
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import request
 import asyncio
 from logger import setup_logger
-from emotion_detector import get_cached_emotion, BackgroundEmotionMonitor
-from ai_core import generate_response
-from tts_output import speak_async, cleanup_audio_file
+from async_runner import async_runner
+from emotion_detector import get_cached_emotion, emotion_monitor, submit_client_frame, has_session, drop_session
+from emotion_events import emotion_events, user_room, CAMERA_ROOM
+from ai_core import generate_response, generate_response_chunks
+from tts_output import speak_async
+from tts_pipeline import SentenceTTSPipeline
 from conversation_memory import memory
 from mood_manager import update_mood
+from voice_tone_analyzer import analyze_voice_tone, combine_emotions
 from main import choose_personality
 from config import Config
 import time
+import base64
+import binascii
+import uuid
 
 logger = setup_logger("websocket")
 
-# Global emotion monitor
-emotion_monitor = None
+# Base64 length of the largest frame accepted, so bigger payloads are dropped undecoded
+MAX_ENCODED_FRAME_CHARS = 4 * -(-Config.MAX_FRAME_BYTES // 3)
 
 def init_socketio(app):
     """Initialize SocketIO with Flask app"""
@@ -32,6 +39,26 @@ def init_socketio(app):
     # Store user sessions and processing flags
     user_sessions = {}
     processing_flags = {} # sid -> bool (True = keep processing, False = stop)
+    
+    # Emotion changes are pushed to rooms instead of being polled
+    emotion_events.subscribe(
+        lambda room, payload: socketio.emit('emotion_update', payload, room=room)
+    )
+    
+    def emit_current_emotion():
+        """Send the caller the emotion its room currently shows"""
+        emotion, confidence = get_cached_emotion(request.sid)
+        emit('emotion_update', {
+            'emotion': emotion,
+            'confidence': float(confidence),
+            'timestamp': time.time()
+        })
+    
+    def start_user_session(user_id):
+        """Bind this connection to a user and subscribe it to their emotion room"""
+        user_sessions[request.sid] = user_id
+        join_room(user_room(user_id))
+        emit_current_emotion()
 
     @socketio.on('connect')
     def handle_connect():
@@ -39,11 +66,9 @@ def init_socketio(app):
         logger.info(f"Client connected: {request.sid}")
         emit('connected', {'message': 'Connected to ROOMii backend'})
         
-        # Start background emotion monitoring
-        global emotion_monitor
-        if emotion_monitor is None:
-            emotion_monitor = BackgroundEmotionMonitor(interval=5.0)
-            emotion_monitor.start()
+        # Emotion monitoring runs while at least one client is connected
+        join_room(CAMERA_ROOM)
+        emotion_monitor.acquire(request.sid)
 
     @socketio.on('restore_session')
     def handle_restore_session(data):
@@ -54,12 +79,13 @@ def init_socketio(app):
         if user_id and username:
             # In a real app, we would verify a token here.
             # For now, we trust the client's stored ID/username match.
-            user_sessions[request.sid] = user_id
+            start_user_session(user_id)
             logger.info(f"Session restored for user: {username} (ID: {user_id})")
             emit('login_success', {'user_id': user_id, 'username': username})
+            async_runner.spawn(memory.warm_context(user_id), description="Warming context cache")
             
             # Send history immediately
-            history = asyncio.run(memory.get_recent_conversations(user_id, 20))
+            history = async_runner.run(memory.get_recent_conversations(user_id, 20))
             emit('conversation_history', {'history': history})
 
     @socketio.on('stop_response')
@@ -79,13 +105,14 @@ def init_socketio(app):
             emit('auth_error', {'message': 'Username and password required'})
             return
             
-        user_id = asyncio.run(memory.create_user(username, password))
+        user_id = async_runner.run(memory.create_user(username, password))
         if user_id:
-            user_sessions[request.sid] = user_id
+            start_user_session(user_id)
             logger.info(f"User signed up: {username} (ID: {user_id})")
             emit('login_success', {'user_id': user_id, 'username': username})
+            async_runner.spawn(memory.warm_context(user_id), description="Warming context cache")
             # Send history immediately
-            history = asyncio.run(memory.get_recent_conversations(user_id, 20))
+            history = async_runner.run(memory.get_recent_conversations(user_id, 20))
             emit('conversation_history', {'history': history})
         else:
             emit('auth_error', {'message': 'Username already exists'})
@@ -100,13 +127,14 @@ def init_socketio(app):
             emit('auth_error', {'message': 'Username and password required'})
             return
 
-        user_id = asyncio.run(memory.verify_user(username, password))
+        user_id = async_runner.run(memory.verify_user(username, password))
         if user_id:
-            user_sessions[request.sid] = user_id
+            start_user_session(user_id)
             logger.info(f"User logged in: {username} (ID: {user_id})")
             emit('login_success', {'user_id': user_id, 'username': username})
+            async_runner.spawn(memory.warm_context(user_id), description="Warming context cache")
             # Send history immediately
-            history = asyncio.run(memory.get_recent_conversations(user_id, 20))
+            history = async_runner.run(memory.get_recent_conversations(user_id, 20))
             emit('conversation_history', {'history': history})
         else:
             emit('auth_error', {'message': 'Invalid username or password'})
@@ -114,51 +142,146 @@ def init_socketio(app):
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle client disconnection"""
-        if request.sid in user_sessions:
-            del user_sessions[request.sid]
+        user_id = user_sessions.pop(request.sid, None)
+        if user_id is not None and user_id not in user_sessions.values():
+            # Last connection of this user: drop the room's debounce state and timer
+            emotion_events.forget(user_room(user_id))
         if request.sid in processing_flags:
             del processing_flags[request.sid]
+        emotion_monitor.release(request.sid)
+        drop_session(request.sid)
+        emotion_events.forget(request.sid)
         logger.info(f"Client disconnected: {request.sid}")
     
     @socketio.on('get_emotion')
     def handle_get_emotion():
-        """Send current cached emotion"""
-        emotion, confidence = get_cached_emotion()
-        emit('emotion_update', {
-            'emotion': emotion,
-            'confidence': float(confidence),
-            'timestamp': time.time()
-        })
+        """Send current cached emotion (changes are also pushed as they happen)"""
+        emit_current_emotion()
     
+    @socketio.on('video_frame')
+    def handle_video_frame(data):
+        """Analyze a compressed webcam frame pushed by the client"""
+        sid = request.sid
+        frame = data.get('frame') if isinstance(data, dict) else data
+        if not frame:
+            return
+        if isinstance(frame, str):
+            # Base64, optionally as a data URL; size-checked before decoding
+            encoded = frame.split(',', 1)[-1]
+            if len(encoded) > MAX_ENCODED_FRAME_CHARS:
+                logger.warning(f"Dropping oversized frame ({len(encoded)} base64 chars) from {sid}")
+                return
+            try:
+                frame = base64.b64decode(encoded, validate=True)
+            except (binascii.Error, ValueError):
+                logger.warning(f"Dropping frame with invalid base64 from {sid}")
+                return
+        if not isinstance(frame, (bytes, bytearray)):
+            return
+        if len(frame) > Config.MAX_FRAME_BYTES:
+            logger.warning(f"Dropping oversized frame ({len(frame)} bytes) from {sid}")
+            return
+        
+        if not has_session(sid):
+            # This client brings its own camera; the server camera isn't needed for it
+            emotion_monitor.release(sid)
+            leave_room(CAMERA_ROOM)
+        
+        # Results go to every connection of the user, or just this one before login
+        user_id = user_sessions.get(sid)
+        room = user_room(user_id) if user_id else sid
+        submit_client_frame(
+            sid,
+            frame,
+            user_id=user_id,
+            on_result=lambda emotion, confidence: emotion_events.publish(room, emotion, confidence)
+        )
+    
+    def is_cancelled(sid):
+        """Check the per-session cancellation token set by stop_response"""
+        return not processing_flags.get(sid, True)
+
+    async def persist_exchange(user_id, user_message, response_text, emotion,
+                               confidence, sentiment, mood):
+        """Store the conversation and emotion record concurrently"""
+        await asyncio.gather(
+            memory.add_conversation(
+                user_id,
+                user_message,
+                response_text,
+                emotion,
+                sentiment,
+                mood
+            ),
+            memory.add_emotion_record(
+                user_id,
+                emotion,
+                confidence,
+                mood
+            )
+        )
+
+    def stream_reply(sid, chunks, persona, on_token=None):
+        """
+        Emit message_chunk events as tokens arrive.
+        Returns the full reply text, or None if the client stopped the stream.
+        """
+        parts = []
+        try:
+            for index, token in enumerate(chunks):
+                if is_cancelled(sid):
+                    logger.info("Streaming cancelled by user")
+                    return None
+                parts.append(token)
+                emit('message_chunk', {
+                    'text': token,
+                    'index': index,
+                    'personality': persona['name']
+                })
+                if on_token:
+                    on_token(token)
+        finally:
+            # Closes the HTTP stream if we stopped early
+            chunks.close()
+        return "".join(parts).strip()
+
     @socketio.on('send_message')
     def handle_message(data):
-        """Handle incoming user message"""
+        """
+        Handle incoming user message as a staged pipeline:
+        context fetch overlaps emotion analysis, the reply is emitted as soon
+        as it exists, and TTS and persistence run off the critical path
+        """
+        context_future = None
         try:
+            sid = request.sid
             # Set processing flag to True for this new request
-            processing_flags[request.sid] = True
+            processing_flags[sid] = True
             
             user_message = data.get('message', '').strip()
             if not user_message:
                 emit('error', {'message': 'Empty message received'})
                 return
             
-            user_id = user_sessions.get(request.sid)
+            user_id = user_sessions.get(sid)
             if not user_id:
                 emit('error', {'message': 'User not logged in'})
                 return
 
             logger.info(f"Received message from user {user_id}: {user_message}")
-            
-            # Check cancellation
-            if not processing_flags.get(request.sid, True):
+
+            # Stage 1: start the context fetch on the background loop
+            context_future = async_runner.submit(memory.get_context_for_ai(
+                user_id,
+                max_messages=Config.CONVERSATION_CONTEXT_LENGTH
+            ))
+
+            # Stage 2: emotion analysis runs here while the context loads
+            if is_cancelled(sid):
                 logger.info("Processing cancelled by user")
                 return
 
-            # Get current emotion from face
-            face_emotion, face_confidence = get_cached_emotion()
-            
-            # Analyze voice tone from text
-            from voice_tone_analyzer import analyze_voice_tone, combine_emotions
+            face_emotion, face_confidence = get_cached_emotion(sid)
             voice_emotion, voice_confidence = analyze_voice_tone(text=user_message)
             
             # Combine face and voice emotions
@@ -177,68 +300,105 @@ def init_socketio(app):
             # Choose personality
             persona = choose_personality(combined_mood)
             
-            # Get conversation context
-            context = asyncio.run(memory.get_context_for_ai(
-                user_id, 
-                max_messages=Config.CONVERSATION_CONTEXT_LENGTH
-            ))
-            
-            # Check cancellation before expensive generation
-            if not processing_flags.get(request.sid, True):
+            # Check cancellation before waiting on the context
+            if is_cancelled(sid):
+                logger.info("Processing cancelled before context fetch finished")
+                return
+
+            context = context_future.result(timeout=Config.REQUEST_TIMEOUT)
+
+            # Stage 3: generate the reply
+            if is_cancelled(sid):
                 logger.info("Processing cancelled before generation")
                 return
 
-            # Generate AI response
-            response_text = generate_response(
-                user_message,
-                emotion,
-                sentiment,
-                history=context,
-                personality=combined_mood
-            )
-            
-            # Check cancellation before sending
-            if not processing_flags.get(request.sid, True):
+            streaming = data.get('stream', Config.STREAM_RESPONSES)
+            audio_pipeline = None
+            if streaming:
+                # Speak each sentence as soon as the stream completes it
+                if Config.TTS_SENTENCE_PIPELINE:
+                    # Lets the client drop clips left over from an earlier reply
+                    reply_id = uuid.uuid4().hex
+                    audio_pipeline = SentenceTTSPipeline(
+                        persona['tone'],
+                        on_audio=lambda index, path: socketio.emit('audio_chunk', {
+                            'audio_url': f"/{path}",
+                            'index': index,
+                            'reply_id': reply_id
+                        }, room=sid),
+                        is_cancelled=lambda: is_cancelled(sid)
+                    )
+
+                response_text = stream_reply(
+                    sid,
+                    generate_response_chunks(
+                        user_message,
+                        emotion,
+                        sentiment,
+                        history=context,
+                        personality=combined_mood
+                    ),
+                    persona,
+                    on_token=audio_pipeline.feed if audio_pipeline else None
+                )
+                if response_text is None:
+                    if audio_pipeline:
+                        audio_pipeline.cancel()
+                    return
+            else:
+                response_text = generate_response(
+                    user_message,
+                    emotion,
+                    sentiment,
+                    history=context,
+                    personality=combined_mood
+                )
+            
+            # Stage 4: deliver the reply
+            if is_cancelled(sid):
                 logger.info("Processing cancelled before sending response")
                 return
 
-            # Send text response immediately
+            # Streamed replies still get a final message with the full text
             emit('message_response', {
                 'text': response_text,
                 'emotion': emotion,
                 'mood': combined_mood,
-                'personality': persona['name']
+                'personality': persona['name'],
+                'streamed': streaming
             })
             
-            # Generate audio in background
-            socketio.start_background_task(
-                generate_and_send_audio,
-                response_text,
-                persona['tone'],
-                request.sid
+            # Stage 5: audio and persistence run in the background
+            if audio_pipeline:
+                socketio.start_background_task(finish_sentence_audio, audio_pipeline, sid, reply_id)
+            else:
+                socketio.start_background_task(
+                    generate_and_send_audio,
+                    response_text,
+                    persona['tone'],
+                    sid
+                )
+            
+            async_runner.spawn(
+                persist_exchange(
+                    user_id,
+                    user_message,
+                    response_text,
+                    emotion,
+                    confidence,
+                    sentiment,
+                    combined_mood
+                ),
+                description=f"Persisting exchange for user {user_id}"
             )
             
-            # Store conversation (async)
-            asyncio.run(memory.add_conversation(
-                user_id,
-                user_message,
-                response_text,
-                emotion,
-                sentiment,
-                combined_mood
-            ))
-            
-            # Store emotion record
-            asyncio.run(memory.add_emotion_record(
-                user_id,
-                emotion,
-                confidence,
-                combined_mood
-            ))
-            
         except Exception as e:
             logger.error(f"Message handling error: {e}")
             emit('error', {'message': 'Failed to process message'})
+        finally:
+            # Don't leave an abandoned context fetch running
+            if context_future is not None and not context_future.done():
+                context_future.cancel()
     
     @socketio.on('voice_command')
     def handle_voice_command(data):
@@ -288,12 +448,11 @@ def init_socketio(app):
                 return
 
             # Generate audio
-            audio_path = asyncio.run(speak_async(text, tone))
+            audio_path = async_runner.run(speak_async(text, tone))
             
-            # Check cancellation before sending
+            # Check cancellation before sending; the clip stays cached for reuse
             if not processing_flags.get(sid, True):
                 logger.info("Audio sending cancelled")
-                cleanup_audio_file(audio_path)
                 return
 
             if audio_path:
@@ -301,13 +460,20 @@ def init_socketio(app):
                 socketio.emit('audio_ready', {
                     'audio_url': f"/{audio_path}"
                 }, room=sid)
-                
-                # Schedule cleanup
-                socketio.sleep(Config.AUDIO_CLEANUP_DELAY)
-                cleanup_audio_file(audio_path)
         except Exception as e:
             logger.error(f"Audio generation error: {e}")
     
+    def finish_sentence_audio(pipeline, sid, reply_id):
+        """Background task to flush the sentence TTS pipeline"""
+        audio_paths = []
+        try:
+            audio_paths = pipeline.finish(timeout=Config.REQUEST_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Sentence audio error: {e}")
+        # Sent even after errors, so the client knows no more clips are coming
+        if not is_cancelled(sid):
+            socketio.emit('audio_complete', {'reply_id': reply_id, 'count': len(audio_paths)}, room=sid)
+    
     @socketio.on('get_conversation_history')
     def handle_get_history(data):
         """Send conversation history"""
@@ -317,7 +483,7 @@ def init_socketio(app):
                 return
                 
             limit = data.get('limit', 20)
-            history = asyncio.run(memory.get_recent_conversations(user_id, limit))
+            history = async_runner.run(memory.get_recent_conversations(user_id, limit))
             emit('conversation_history', {'history': history})
         except Exception as e:
             logger.error(f"History retrieval error: {e}")
@@ -332,7 +498,7 @@ def init_socketio(app):
                 return
 
             hours = data.get('hours', 24)
-            history = asyncio.run(memory.get_emotion_history(user_id, hours))
+            history = async_runner.run(memory.get_emotion_history(user_id, hours))
             emit('emotion_history', {'history': history})
         except Exception as e:
             logger.error(f"Emotion history retrieval error: {e}")
@@ -347,7 +513,7 @@ def init_socketio(app):
                 emit('error', {'message': 'User not logged in'})
                 return
 
-            asyncio.run(memory.clear_user_history(user_id))
+            async_runner.run(memory.clear_user_history(user_id))
             emit('history_cleared', {'message': 'Chat history cleared'})
             logger.info(f"History cleared for user {user_id}")
         except Exception as e:
@@ -367,18 +533,10 @@ def init_socketio(app):
             
             days = data.get('days', 7)
             
-            # Get all analytics data for this user
-            summary = asyncio.run(analytics_engine.get_emotion_summary(user_id, days))
-            calendar = asyncio.run(analytics_engine.get_mood_calendar(user_id, 30))
-            insights = asyncio.run(analytics_engine.generate_insights(user_id))
-            trends = asyncio.run(analytics_engine.get_emotion_trends(user_id, days))
-            
-            emit('analytics_data', {
-                'summary': summary,
-                'calendar': calendar,
-                'insights': insights,
-                'trends': trends
-            })
+            # Summary, calendar, insights and trends from one fetch
+            dashboard = async_runner.run(analytics_engine.get_dashboard(user_id, days))
+            
+            emit('analytics_data', dashboard)
             
             logger.info(f"Analytics data sent for user {user_id} ({days} days)")
         except Exception as e:
@@ -395,7 +553,6 @@ def init_socketio(app):
                 return
             
             from emotion_calibration import calibrator
-            import base64
             
             emotion = data.get('emotion')
             frame_data_b64 = data.get('frame_data')
@@ -408,7 +565,7 @@ def init_socketio(app):
             frame_data = base64.b64decode(frame_data_b64)
             
             # Save calibration sample
-            success = asyncio.run(calibrator.save_calibration_sample(user_id, emotion, frame_data))
+            success = async_runner.run(calibrator.save_calibration_sample(user_id, emotion, frame_data))
             
             if success:
                 emit('calibration_sample_saved', {'emotion': emotion})
@@ -431,7 +588,7 @@ def init_socketio(app):
             
             from emotion_calibration import calibrator
             
-            has_calibration = asyncio.run(calibrator.has_calibration(user_id))
+            has_calibration = async_runner.run(calibrator.has_calibration(user_id))
             emit('calibration_status', {'has_calibration': has_calibration})
             
         except Exception as e:
@@ -449,7 +606,7 @@ def init_socketio(app):
             
             from emotion_calibration import calibrator
             
-            asyncio.run(calibrator.clear_calibration(user_id))
+            async_runner.run(calibrator.clear_calibration(user_id))
             emit('calibration_cleared', {'message': 'Calibration data cleared'})
             logger.info(f"Calibration cleared for user {user_id}")
             
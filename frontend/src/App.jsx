@@ -173,6 +173,9 @@ export default function App() {
   const [authError, setAuthError] = useState("");
 
   const audioRef = useRef(null);
+  const audioQueueRef = useRef([]);
+  const audioReplyRef = useRef(null); // reply whose sentence clips are queued
+  const audioReplyDoneRef = useRef(true); // no more clips coming for that reply
   const recognitionRef = useRef(null);
   const socketRef = useRef(null);
   const chatEndRef = useRef(null);
@@ -252,12 +255,35 @@ export default function App() {
       alert("Chat history cleared!");
     });
 
+    socket.on('message_chunk', (data) => {
+      setMessages(prev => {
+        const last = prev[prev.length - 1];
+        if (last && last.sender === "bot" && last.streaming) {
+          return [...prev.slice(0, -1), { ...last, text: last.text + data.text }];
+        }
+        return [...prev, {
+          sender: "bot",
+          text: data.text,
+          personality: data.personality,
+          streaming: true
+        }];
+      });
+    });
+
     socket.on('message_response', (data) => {
-      setMessages(prev => [...prev, {
-        sender: "bot",
-        text: data.text,
-        personality: data.personality
-      }]);
+      setMessages(prev => {
+        const message = {
+          sender: "bot",
+          text: data.text,
+          personality: data.personality
+        };
+        // Replace the partial streamed message with the final text
+        const last = prev[prev.length - 1];
+        if (last && last.sender === "bot" && last.streaming) {
+          return [...prev.slice(0, -1), message];
+        }
+        return [...prev, message];
+      });
       setCurrentPersonality(data.personality || "Echo");
       setIsProcessing(false);
     });
@@ -279,6 +305,54 @@ export default function App() {
       }
     });
 
+    // Sentence clips arrive in order while the reply is still streaming
+    const playNextChunk = () => {
+      const url = audioQueueRef.current.shift();
+      if (!url) {
+        audioRef.current = null;
+        // Between sentences the next clip may still be synthesizing
+        if (audioReplyDoneRef.current) setIsSpeaking(false);
+        return;
+      }
+      const audio = new Audio(`http://127.0.0.1:5000${url}`);
+      audioRef.current = audio;
+      audio.onended = playNextChunk;
+      audio.play().catch((err) => {
+        console.error(err);
+        playNextChunk();
+      });
+    };
+
+    socket.on('audio_chunk', (data) => {
+      if (!data.audio_url) return;
+      if (data.reply_id !== audioReplyRef.current) {
+        // First clip of a new reply replaces anything left from the last one
+        audioReplyRef.current = data.reply_id;
+        audioReplyDoneRef.current = false;
+        audioQueueRef.current = [];
+        audioRef.current?.pause();
+        audioRef.current = null;
+      }
+      audioQueueRef.current.push(data.audio_url);
+      if (!audioRef.current) {
+        recognitionRef.current?.abort();
+        setIsSpeaking(true);
+        playNextChunk();
+      }
+    });
+
+    socket.on('audio_complete', (data) => {
+      if (data.reply_id !== audioReplyRef.current) {
+        // No clip of this reply was delivered (all failed, or it was empty)
+        if (!audioRef.current) setIsSpeaking(false);
+        return;
+      }
+      audioReplyDoneRef.current = true;
+      if (!audioRef.current && audioQueueRef.current.length === 0) {
+        setIsSpeaking(false);
+      }
+    });
+
     socket.on('error', (data) => {
       console.error('Backend error:', data.message);
       if (data.message === 'User not logged in') {
@@ -291,15 +365,9 @@ export default function App() {
       }
     });
 
-    // Request emotion updates periodically
-    const emotionInterval = setInterval(() => {
-      if (socket.connected && isLoggedIn) {
-        socket.emit('get_emotion');
-      }
-    }, 5000);
+    // Emotion changes are pushed by the backend as 'emotion_update'; no polling needed
 
     return () => {
-      clearInterval(emotionInterval);
       socket.disconnect();
     };
   }, [isLoggedIn]);
@@ -334,6 +402,8 @@ export default function App() {
 
   /* ⛔ Stop */
   const handleStop = () => {
+    audioQueueRef.current = [];
+    audioReplyDoneRef.current = true;
     if (audioRef.current) {
       audioRef.current.pause();
       audioRef.current.currentTime = 0;
@@ -348,6 +418,53 @@ export default function App() {
     }
   };
 
+  /* 📷 Webcam frames for server-side emotion detection */
+  useEffect(() => {
+    if (!micGranted || !isLoggedIn) return;
+
+    let stream = null;
+    let timer = null;
+    let sending = false;
+    const video = document.createElement('video');
+    video.muted = true;
+    video.playsInline = true;
+    const canvas = document.createElement('canvas');
+
+    const sendFrame = () => {
+      const socket = socketRef.current;
+      if (sending || !socket?.connected || !video.videoWidth) return;
+      sending = true;
+      // Small frames are plenty for face emotion and keep uploads cheap
+      const scale = Math.min(1, 320 / video.videoWidth);
+      canvas.width = Math.round(video.videoWidth * scale);
+      canvas.height = Math.round(video.videoHeight * scale);
+      canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+      canvas.toBlob(async (blob) => {
+        try {
+          if (blob) socket.emit('video_frame', { frame: await blob.arrayBuffer() });
+        } finally {
+          sending = false;
+        }
+      }, 'image/jpeg', 0.7);
+    };
+
+    navigator.mediaDevices.getUserMedia({ video: { width: 640, height: 480 } })
+      .then((s) => {
+        stream = s;
+        video.srcObject = s;
+        return video.play();
+      })
+      .then(() => {
+        timer = setInterval(sendFrame, 1000);
+      })
+      .catch((err) => console.warn('Webcam unavailable, using server camera:', err));
+
+    return () => {
+      clearInterval(timer);
+      stream?.getTracks().forEach(track => track.stop());
+    };
+  }, [micGranted, isLoggedIn]);
+
   /* 🎤 Speech Recognition with Silence Detection */
   useEffect(() => {
     if (!micGranted || !settings.autoListen || !isLoggedIn) return;
@@ -688,7 +805,7 @@ export default function App() {
                     >
                       {msg.sender === "user" && "🧍 You: "}
                       {msg.sender === "bot" && `🤖 ${msg.personality || 'ROOMii'}: `}
-                      {msg.sender === "bot" && i === messages.length - 1 && isProcessing ? (
+                      {msg.sender === "bot" && i === messages.length - 1 && isProcessing && !msg.streaming ? (
                         <StreamingText text={msg.text} speed={20} />
                       ) : (
                         msg.text